@@ -39,4 +39,10 @@ class LoginForm(FlaskForm):
     password = PasswordField(validators=[DataRequired()])
     pin = StringField(validators=[DataRequired()])
     recaptcha = RecaptchaField()
+    submit = SubmitField()
+
+class ChangePasswordForm(FlaskForm):
+    current_password = PasswordField(validators=[DataRequired()])
+    new_password = PasswordField(validators=[DataRequired(), StrongPassword])
+    confirm_password = PasswordField(validators=[DataRequired(), EqualTo('new_password', message='Both password fields must be equal!')])
     submit = SubmitField()
\ No newline at end of file
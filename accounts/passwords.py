@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from argon2.exceptions import VerificationError, InvalidHashError
+from werkzeug.exceptions import ServiceUnavailable
+
+
+class PasswordService:
+    """Runs Argon2 hashing and verification on a bounded thread pool.
+
+    argon2-cffi releases the GIL while hashing, so `max_workers` caps how many cores password work
+    can use at once. A request that cannot get a worker within `queue_timeout` seconds fails with
+    503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, hasher, max_workers=2, queue_timeout=5.0):
+        self.hasher = hasher
+        self._executor = None
+        self.configure(max_workers, queue_timeout)
+
+    def configure(self, max_workers, queue_timeout):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='argon2')
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceUnavailable('Too many concurrent logins, please try again shortly.')
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def verify(self, password_hash, password):
+        try:
+            return self._run(self.hasher.verify, password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, password_hash):
+        return self.hasher.check_needs_rehash(password_hash)
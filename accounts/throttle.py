@@ -0,0 +1,161 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+class Entry:
+    __slots__ = ('window_start', 'previous', 'current', 'blocked_until')
+
+    def __init__(self, window_start, previous=0, current=0, blocked_until=0.0):
+        self.window_start = window_start
+        self.previous = previous
+        self.current = current
+        self.blocked_until = blocked_until
+
+
+class LoginThrottle:
+    """Server-side sliding-window count of failed logins, keyed by kind (e.g. 'ip', 'email') and value.
+
+    Each key keeps two fixed-window counters and the estimate weights the previous window by how
+    much of it still overlaps the sliding window. Once a key goes over its limit it is blocked
+    for base_delay * 2 ** (failures over the limit) seconds, capped at max_delay. At most
+    max_keys keys are tracked, least recently used first out, and keys are stored as short
+    hashes so neither memory nor the state file holds raw emails or IPs. State is merged into the
+    SQLite file at persist_path at most every persist_interval seconds and reloaded on start.
+    """
+
+    def __init__(self, limits, window=900, base_delay=1.0, max_delay=3600.0, max_keys=100000,
+                 persist_path=None, persist_interval=60.0):
+        self._entries = OrderedDict()
+        self._cleared = set()  # keys cleared by a successful login since the last persist
+        self._lock = threading.Lock()
+        self.configure(limits, window, base_delay, max_delay, max_keys, persist_path, persist_interval)
+
+    def configure(self, limits, window=900, base_delay=1.0, max_delay=3600.0, max_keys=100000,
+                  persist_path=None, persist_interval=60.0):
+        """Change the settings and load any state saved at persist_path."""
+        self.limits = limits
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        self._next_persist = time.time() + persist_interval
+        self.load()
+
+    @staticmethod
+    def _key(kind, value):
+        return hashlib.blake2b(f"{kind}:{str(value).lower()}".encode(), digest_size=8).hexdigest()
+
+    def _roll(self, entry, now):
+        elapsed_windows = int((now - entry.window_start) // self.window)
+        if elapsed_windows >= 1:
+            entry.previous = entry.current if elapsed_windows == 1 else 0
+            entry.current = 0
+            entry.window_start += elapsed_windows * self.window
+
+    def _estimate(self, entry, now):
+        overlap = 1 - (now - entry.window_start) / self.window
+        return entry.previous * overlap + entry.current
+
+    def retry_after(self, **keys):
+        """Seconds until every given key may attempt a login again, 0 if none are blocked."""
+        now = time.time()
+        with self._lock:
+            waits = [entry.blocked_until - now for entry in
+                     (self._entries.get(self._key(kind, value)) for kind, value in keys.items() if value)
+                     if entry is not None]
+        return max([0] + waits)
+
+    def failure(self, **keys):
+        now = time.time()
+        with self._lock:
+            for kind, value in keys.items():
+                if not value:
+                    continue
+                key = self._key(kind, value)
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = Entry(now)
+                    if len(self._entries) > self.max_keys:
+                        self._entries.popitem(last=False)
+                else:
+                    self._entries.move_to_end(key)
+                    self._roll(entry, now)
+                entry.current += 1
+
+                over = math.floor(self._estimate(entry, now)) - self.limits[kind]
+                if over >= 0:
+                    entry.blocked_until = now + min(self.max_delay, self.base_delay * 2 ** over)
+        if now >= self._next_persist:
+            self.persist()
+
+    def success(self, **keys):
+        with self._lock:
+            for kind, value in keys.items():
+                if value:
+                    key = self._key(kind, value)
+                    self._entries.pop(key, None)
+                    self._cleared.add(key)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.persist_path, timeout=10, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, window_start REAL NOT NULL, "
+                     "previous INTEGER NOT NULL, current INTEGER NOT NULL, blocked_until REAL NOT NULL)")
+        return conn
+
+    def persist(self):
+        """Merge this process's state into persist_path, which every worker process shares.
+
+        A key another worker also saved keeps the later window, or the higher counts within the same window,
+        and the later block, so no worker's strikes are overwritten by another's.
+        """
+        if not self.persist_path:
+            return
+        now = time.time()
+        with self._lock:
+            self._next_persist = now + self.persist_interval
+            rows = [(key, entry.window_start, entry.previous, entry.current, entry.blocked_until)
+                    for key, entry in self._entries.items()
+                    if entry.blocked_until > now or now - entry.window_start < 2 * self.window]
+            cleared, self._cleared = self._cleared, set()
+        # With nothing to save the file is left alone, and not created where there is none yet.
+        if not rows and not (cleared and os.path.exists(self.persist_path)):
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM throttle WHERE key = ?", [(key,) for key in cleared])
+                conn.executemany(
+                    "INSERT INTO throttle (key, window_start, previous, current, blocked_until) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                    "previous = CASE WHEN excluded.window_start > window_start THEN excluded.previous "
+                    "WHEN excluded.window_start < window_start THEN previous "
+                    "ELSE max(previous, excluded.previous) END, "
+                    "current = CASE WHEN excluded.window_start > window_start THEN excluded.current "
+                    "WHEN excluded.window_start < window_start THEN current "
+                    "ELSE max(current, excluded.current) END, "
+                    "window_start = max(window_start, excluded.window_start), "
+                    "blocked_until = max(blocked_until, excluded.blocked_until)", rows)
+                conn.execute("DELETE FROM throttle WHERE blocked_until <= ? AND window_start <= ?",
+                             (now, now - 2 * self.window))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT key, window_start, previous, current, blocked_until FROM throttle "
+                                "ORDER BY window_start DESC LIMIT ?", (self.max_keys,)).fetchall()
+        with self._lock:
+            for key, *fields in reversed(rows):
+                self._entries[key] = Entry(*fields)
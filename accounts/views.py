@@ -1,8 +1,14 @@
+import asyncio
+import math
+
 import flask
 import flask_login
 from flask import Blueprint, render_template, flash, redirect, url_for, session
-from accounts.forms import RegistrationForm, LoginForm
-from config import User, db, limiter, anonymous_required, logger, ph
+from accounts.forms import RegistrationForm, LoginForm, ChangePasswordForm
+from config import User, Post, EventCount, db, async_db, limiter, anonymous_required, logger, passwords, \
+    login_throttle, drop_cached_plaintext, schedule_rotation
+from posts.views import AUTHORS, decrypt_posts
+from sqlalchemy import select
 from markupsafe import Markup
 from flask_login import login_required
 
@@ -20,7 +26,7 @@ def registration():
             flash('Email already exists', category="danger")
             return render_template('accounts/registration.html', form=form)
 
-        password = ph.hash(form.password.data)
+        password = passwords.hash(form.password.data)
         new_user = User(email=form.email.data,
                         firstname=form.firstname.data,
                         lastname=form.lastname.data,
@@ -29,11 +35,13 @@ def registration():
                         )
 
         db.session.add(new_user)
+        EventCount.record('registration')
         db.session.commit()
 
         new_user.generate_log()
 
-        logger.info(f"User Registered. Email: {new_user.email} Role: {new_user.role} IP: {flask.request.remote_addr}")
+        logger.info("User Registered", extra={'email': new_user.email, 'role': new_user.role,
+                                              'ip': flask.request.remote_addr})
 
         flash('Account Created. You must Set up MFA before logging in', category='success')
         return render_template('accounts/mfa.html', key=new_user.mfa_key, uri=new_user.uri)
@@ -52,28 +60,42 @@ def login():
     if not session.get("login attempts"):
         session["login attempts"] = 0
 
+    # ----THROTTLED----
+    # Checked before the form is validated, so throttled attempts cost no CAPTCHA call, query or hash.
+    if form.is_submitted():
+        retry_after = login_throttle.retry_after(ip=flask.request.remote_addr, email=form.email.data)
+        if retry_after:
+            logger.info("Throttled Login Attempt", extra={'email': form.email.data, 'ip': flask.request.remote_addr})
+            flash(f'Too many failed login attempts. Try again in {math.ceil(retry_after)} seconds.', category='danger')
+            return render_template('accounts/login.html', form=form), 429
+
     if form.validate_on_submit():
 
         user = User.query.filter_by(email=form.email.data).first()
+        password_valid = bool(user) and user.verify_password(form.password.data)
 
         # ----VALID LOGIN----
-        if user and user.verify_password(form.password.data) and user.mfa_enabled and user.verify_pin(form.pin.data):
+        if password_valid and user.mfa_enabled and user.verify_pin(form.pin.data):
+            login_throttle.success(email=user.email)
             flask_login.login_user(user)
             user.log.login()
-            logger.info(f"Successful Login. Email: {user.email} Role: {user.role} IP: {flask.request.remote_addr}")
+            logger.info("Successful Login", extra={'email': user.email, 'role': user.role,
+                                                   'ip': flask.request.remote_addr})
             flash('Authentication Success', category='success')
             return redirect(url_for('posts.posts'))
 
         # ----MFA SETUP----
-        elif user and user.verify_password(form.password.data) and not user.mfa_enabled:
+        elif password_valid and not user.mfa_enabled:
             # ----VALID LOGIN ENABLING MFA----
             if user.verify_pin(form.pin.data):
                 user.mfa_enabled = True
                 db.session.commit()
 
+                login_throttle.success(email=user.email)
                 flask_login.login_user(user)
                 user.log.login()
-                logger.info(f"Successful Login. Email: {user.email} Role: {user.role} IP: {flask.request.remote_addr}")
+                logger.info("Successful Login", extra={'email': user.email, 'role': user.role,
+                                                       'ip': flask.request.remote_addr})
                 flash('Authentication Success', category='success')
                 return redirect(url_for('posts.posts'))
 
@@ -85,8 +107,13 @@ def login():
         # ----INVALID--------
         else:
             session["login attempts"] += 1
-            logger.info(f"Unsuccessful Login Attempt. Email: {user.email} Attempts Made: {session['login attempts']}"
-                        f" IP: {flask.request.remote_addr}")
+            login_throttle.failure(ip=flask.request.remote_addr, email=form.email.data)
+            EventCount.record('failed_login_ip', flask.request.remote_addr)
+            EventCount.record('failed_login_email', form.email.data)
+            db.session.commit()
+            logger.info("Unsuccessful Login Attempt", extra={'email': form.email.data,
+                                                             'attempts': session['login attempts'],
+                                                             'ip': flask.request.remote_addr})
 
             # ATTEMPTS REMAINING
             if session["login attempts"] < max_login_attempts:
@@ -97,8 +124,11 @@ def login():
 
             # LOCKOUT
             else:
-                logger.info(f"Maximum Failed Login Attempts Reached. Email: {user.email} Attempts Made: {session['login attempts']}"
-                            f" IP: {flask.request.remote_addr}")
+                EventCount.record('lockout', form.email.data)
+                db.session.commit()
+                logger.info("Maximum Failed Login Attempts Reached", extra={'email': form.email.data,
+                                                                            'attempts': session['login attempts'],
+                                                                            'ip': flask.request.remote_addr})
                 flash(Markup(
                     'Incorrect Credentials. Exceeded Allowed Login Attempts. <a href="/unlock">Unlock Account</a>'
                 ), category='danger')
@@ -110,7 +140,53 @@ def login():
 @accounts_bp.route('/account')
 @login_required
 def account():
-    return render_template('accounts/account.html', user=flask_login.current_user)
+    user = flask_login.current_user
+    return render_template('accounts/account.html', user=user, posts=decrypt_posts(own_posts(db.session, user.id)))
+
+
+@login_required
+async def account_async():
+    """account() for the async mode: posts are read on the event loop, decrypted and rendered in a thread."""
+    user = flask_login.current_user
+    async with async_db.session() as session:
+        posts = await session.run_sync(own_posts, user.id)
+    return await asyncio.to_thread(lambda: render_template('accounts/account.html', user=user,
+                                                           posts=decrypt_posts(posts)))
+
+
+def own_posts(session, user_id):
+    return session.scalars(select(Post).options(AUTHORS).where(Post.userid == user_id).order_by(Post.id)).all()
+
+
+@accounts_bp.route('/account/password', methods=['GET', 'POST'])
+@login_required
+@limiter.limit('5/minute')
+def change_password():
+    form = ChangePasswordForm()
+
+    if form.validate_on_submit():
+        user = db.session.get(User, flask_login.current_user.id)
+
+        if not passwords.verify(user.password, form.current_password.data):
+            flash('Current password is incorrect', category='danger')
+            return render_template('accounts/change_password.html', form=form)
+
+        if not user.change_password(passwords.hash(form.new_password.data)):
+            flash('Your posts are still being re-encrypted after your last password change. Try again shortly.',
+                  category='info')
+            return render_template('accounts/change_password.html', form=form)
+
+        db.session.commit()
+        drop_cached_plaintext(user.id)
+        if user.rotation is not None:
+            schedule_rotation(user.id)
+
+        logger.info("Password Changed", extra={'email': user.email, 'role': user.role,
+                                               'ip': flask.request.remote_addr})
+        flash('Password Changed', category='success')
+        return redirect(url_for('accounts.account'))
+
+    return render_template('accounts/change_password.html', form=form)
 
 
 @accounts_bp.route('/unlock')
@@ -122,5 +198,6 @@ def unlock():
 @accounts_bp.route('/logout')
 @login_required
 def logout():
+    drop_cached_plaintext(flask_login.current_user.id)
     flask_login.logout_user()
     return redirect(url_for('index'))
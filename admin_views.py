@@ -0,0 +1,148 @@
+import flask
+import flask_login
+from flask import url_for, redirect, flash, render_template
+from flask_admin import Admin
+from flask_admin.contrib.sqla import ModelView, filters
+from flask_admin.menu import MenuLink
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.orm import Query, undefer
+
+from config import db, logger, Post, User
+
+
+class MainIndexLink(MenuLink):
+    def get_url(self):
+        return url_for('index')
+
+
+def estimated_count(session, table):
+    """Approximate number of rows in a table, read without scanning it.
+
+    PostgreSQL's planner statistics are used where they exist, otherwise the largest primary key, which is exact
+    until rows are deleted.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        estimate = session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"),
+                                   {'name': table.name}).scalar()
+        if estimate and estimate > 0:
+            return estimate
+    return session.query(func.max(table.primary_key.columns[0])).scalar() or 0
+
+
+class CountQuery(Query):
+    """Count query of a list view that stops counting after `limit_rows` rows.
+
+    Past that a whole table's count is estimated, and a search or filter is reported as `limit_rows` rows, so a
+    list page never counts through a large table to number its pages.
+    """
+
+    limit_rows = 0
+    table = None
+
+    def scalar(self):
+        rows = self.with_entities(literal_column('1')).limit(self.limit_rows + 1).subquery()
+        count = self.session.query(func.count()).select_from(rows).scalar()
+        if count <= self.limit_rows:
+            return count
+        if self.whereclause is None:
+            return max(estimated_count(self.session, self.table), self.limit_rows)
+        return self.limit_rows
+
+
+class DBAdminView(ModelView):
+    """List view for the db_admin role that stays quick on large tables.
+
+    Counts are capped (see CountQuery), sorting and filters are offered only on indexed columns, and CSV exports
+    stream rows from the database in batches rather than loading them all first.
+    """
+
+    column_display_pk = True
+    column_hide_backrefs = False
+
+    can_edit = False
+    can_create = False
+    can_delete = False
+    can_export = True
+    export_types = ['csv']
+
+    count_limit = 10000
+    export_batch_size = 1000
+
+    def configure(self, config):
+        self.page_size = config['ADMIN_PAGE_SIZE']
+        self.count_limit = config['ADMIN_COUNT_LIMIT']
+        self.export_batch_size = config['ADMIN_EXPORT_BATCH_SIZE']
+        self.export_max_rows = config['ADMIN_EXPORT_MAX_ROWS']
+
+    def get_count_query(self):
+        query = CountQuery([func.count('*')], session=self.session()).select_from(self.model)
+        query.limit_rows = self.count_limit
+        query.table = self.model.__table__
+        return query
+
+    def _export_data(self):
+        view_args = self._get_list_extra_args()
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+        _, query = self.get_list(0, sort_column, view_args.sort_desc, view_args.search, view_args.filters,
+                                 execute=False, page_size=self.export_max_rows)
+        return None, query.yield_per(self.export_batch_size)
+
+    def is_accessible(self):
+        return flask_login.current_user.is_authenticated and flask_login.current_user.role == "db_admin"
+
+    def inaccessible_callback(self, name, **kwargs):
+        if flask_login.current_user.is_authenticated:
+            user = flask_login.current_user
+            logger.info("Unauthorised Role Access Attempt", extra={'email': user.email, 'role': user.role,
+                                                                   'url': '/admin/', 'ip': flask.request.remote_addr})
+            return render_template('errors/403.html')
+        else:
+            flash("Login to view this Page.", category='info')
+            return redirect(url_for('accounts.login'))
+
+
+def user_email(view, context, model, name):
+    return model.user.email if model.user is not None else ''
+
+
+class PostView(DBAdminView):
+    column_list = ('id', 'userid', 'created', 'title', 'body', 'user')
+    # The author is joined into the list query, one query per page.
+    column_select_related_list = (Post.user,)
+    column_formatters = {'user': user_email}
+    column_formatters_export = {'user': user_email}
+
+    column_default_sort = ('id', True)
+    column_sortable_list = ('id', 'userid', 'created')
+    column_filters = (filters.IntEqualFilter(Post.userid, 'User ID'),
+                      filters.DateTimeGreaterFilter(Post.created, 'Created'),
+                      filters.DateTimeSmallerFilter(Post.created, 'Created'),
+                      filters.DateTimeBetweenFilter(Post.created, 'Created'))
+
+
+class UserView(DBAdminView):
+    column_list = ('id', 'role', 'email', 'password', 'firstname', 'lastname', 'phone', 'post_count', 'mfa_enabled',
+                   'mfa_key', 'salt')
+    column_labels = {'post_count': 'Posts'}
+
+    column_default_sort = ('id', True)
+    column_sortable_list = ('id', 'role', 'email')
+    column_filters = (filters.FilterEqual(User.role, 'Role', options=(('end_user', 'end_user'),
+                                                                      ('sec_admin', 'sec_admin'),
+                                                                      ('db_admin', 'db_admin'))),
+                      filters.FilterEqual(User.email, 'Email'))
+
+    def get_query(self):
+        return super().get_query().options(undefer(User.post_count))
+
+
+def init_admin(app):
+    admin = Admin(app, name='DB Admin', template_mode='bootstrap4')
+    admin._menu = admin._menu[1:]
+    admin.add_link(MainIndexLink(name='Home Page'))
+    for view in (PostView(Post, db.session), UserView(User, db.session)):
+        view.configure(app.config)
+        admin.add_view(view)
+    return admin
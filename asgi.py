@@ -0,0 +1,45 @@
+"""ASGI entry point of the async serving mode, e.g.
+
+    uvicorn --factory asgi:create_asgi_app --ssl-keyfile key.pem --ssl-certfile cert.pem
+
+app.py keeps serving the sync mode.
+"""
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from config import create_app
+
+
+class ASGIApp:
+    """The Flask app behind asgiref's WSGI adapter.
+
+    Each request runs in a thread of its own. The async views' coroutines are handed from that thread to the
+    server's event loop, so while they wait on the database the thread only waits on the loop, and all of them
+    share one async connection pool.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        # Without a context of its own every request would run in asgiref's single thread for sync code.
+        async with ThreadSensitiveContext():
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.app.extensions['async_db'].dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None):
+    return ASGIApp(create_app(dict(config or {}, ASYNC_VIEWS=True)))
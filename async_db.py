@@ -0,0 +1,38 @@
+# Async DBAPI driver per database backend, used where SQLALCHEMY_ASYNC_DATABASE_URI is not set.
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+
+def async_url(url):
+    """The async driver's version of a SQLAlchemy URL, e.g. sqlite:///blog.db -> sqlite+aiosqlite:///blog.db."""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for {backend}, set SQLALCHEMY_ASYNC_DATABASE_URI.")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+class AsyncDatabase:
+    """Async engine and sessions for the async views of the ASGI serving mode (see asgi.py).
+
+    Pooled connections belong to the event loop they were opened on. asgi.py runs every async view on the
+    server's one loop, so all of them share the pool.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self._sessions = None
+
+    def init_app(self, app, url):
+        # Imported here so the sync mode does not need the async drivers.
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        self.engine = create_async_engine(url, echo=app.config['SQLALCHEMY_ECHO'],
+                                          **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        self._sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def session(self):
+        """A new AsyncSession, to be used as `async with async_db.session() as session:`."""
+        return self._sessions()
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
@@ -0,0 +1,112 @@
+"""DB admin list pages and CSV export as the posts and users tables grow.
+
+For each size a temporary database is filled with that many posts, spread over a tenth as many users, by bulk
+inserts (the posts are not encrypted, the admin shows them as stored). A db_admin client then times the first
+post and user list pages, a filtered page, a page deep into the table and, where the views allow it, the CSV
+export of every post, whose Python heap peak is traced on its own.
+
+--root imports the app from another checkout, so a before/after comparison is e.g.:
+    git worktree add /tmp/before <commit>
+    python benchmarks/bench_admin.py --root /tmp/before
+    python benchmarks/bench_admin.py
+
+Usage: python benchmarks/bench_admin.py [--root CHECKOUT] [--iterations N] [sizes...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from bench_app import BASE_URL, PASSWORD, PIN, bench_config, fetch, measure
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def fill(db, User, Post, Log, passwords, posts):
+    password_hash = passwords.hash(PASSWORD)
+    users = max(1, posts // 10)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'email': f'user{i}@example.com', 'password': password_hash, 'mfa_enabled': True,
+         'mfa_key': 'A' * 32, 'active': True, 'role': 'db_admin' if i == 1 else 'end_user', 'salt': 'salt',
+         'firstname': 'Bench', 'lastname': 'User', 'phone': '0191-1234567'} for i in range(1, users + 1)])
+    db.session.add(Log(1))  # the admin's, read on login
+    now = datetime.now()
+    for start in range(1, posts + 1, 10000):
+        db.session.execute(db.insert(Post), [
+            {'id': i, 'userid': i % users + 1, 'created': now, 'title': f'title {i}', 'body': f'body {i} ' * 20}
+            for i in range(start, min(posts, start + 9999) + 1)])
+    db.session.commit()
+
+
+def export(app, client):
+    """(seconds, bytes) of the CSV export of every post, read as it streams, or (None, None) if there is none."""
+    with app.app_context():
+        began = time.perf_counter()
+        response = client.get(BASE_URL + '/admin/post/export/csv/')
+        length = sum(len(chunk) for chunk in response.response) if response.mimetype == 'text/csv' else None
+        seconds = time.perf_counter() - began
+        response.close()
+    return seconds, length
+
+
+def run(size, iterations):
+    with tempfile.TemporaryDirectory() as tmp:
+        from config import create_app, db, User, Post, Log, passwords, login_throttle
+
+        app = create_app(bench_config(tmp))
+        handler = app.extensions['security_log']
+        User.verify_pin = lambda self, pin: pin == PIN
+        with app.app_context():
+            try:
+                db.create_all()
+                fill(db, User, Post, Log, passwords, size)
+                client = app.test_client()
+                fetch(app, client, 'POST', '/login',
+                      data={'email': 'user1@example.com', 'password': PASSWORD, 'pin': PIN})
+
+                def page(path):
+                    def get():
+                        response = fetch(app, client, 'GET', path)
+                        assert response.status_code == 200, (path, response.status_code)
+                    return get
+
+                for label, path in (('posts', '/admin/post/'), ('users', '/admin/user/'),
+                                    ('posts by user', '/admin/post/?flt1_0=2'),
+                                    ('posts page 100', '/admin/post/?page=100')):
+                    measure(f'{size} {label}', page(path), iterations)
+
+                seconds, length = export(app, client)
+                tracemalloc.start()
+                export(app, client)
+                peak_heap = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                if length is not None:
+                    print(f"{f'{size} export csv':<22}{seconds:>11.2f}s{length / 1024 / 1024:>9.1f}MB"
+                          f"{peak_heap / 1024 / 1024:>8.1f}MB heap")
+                else:
+                    print(f"{f'{size} export csv':<22}{'not available':>12}")
+            finally:
+                handler.close()
+                login_throttle.persist_path = None
+                db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--root', default=ROOT, help='Checkout to import the app from.')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('sizes', type=int, nargs='*', default=[10000, 100000, 500000])
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.root))
+
+    print(f"{args.root}")
+    print(f"{'benchmark':<22}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in args.sizes:
+        run(size, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
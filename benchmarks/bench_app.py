@@ -0,0 +1,204 @@
+"""End-to-end and micro benchmarks for the blog, written to a JSON file that later runs can be compared against.
+
+The app from config.py is built against a temporary SQLite database seeded with --users users, --posts posts
+and --log-lines security log lines. reCAPTCHA is switched off through TESTING, CSRF and rate limits are off,
+and TOTP verification is replaced by a fixed pin, so logins can be scripted.
+
+Usage:
+    python benchmarks/bench_app.py --output before.json
+    python benchmarks/bench_app.py --output after.json --compare before.json --tolerance 0.2
+
+With --compare the run exits non-zero if any benchmark's p50 is more than --tolerance slower than the baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BASE_URL = 'https://localhost'  # Talisman redirects plain http
+PASSWORD = 'Benchmark1!'
+PIN = '000000'
+
+
+def bench_config(tmp):
+    return {'SECRET_KEY': 'benchmark', 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp}/bench.sqlite",
+            'SECURITY_LOG_FILE': os.path.join(tmp, 'security.log'), 'SECURITY_LOG_INDEX': None,
+            'LOGIN_THROTTLE_STATE': os.path.join(tmp, 'login_throttle.db'), 'RATELIMIT_STORAGE_URI': 'memory://',
+            'RATELIMIT_ENABLED': False, 'TESTING': True, 'WTF_CSRF_ENABLED': False}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(name, function, iterations, warmup=5):
+    for _ in range(warmup):
+        function()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        began = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    result = {'iterations': iterations, 'throughput_per_s': iterations / elapsed,
+              'p50_ms': percentile(samples, 0.5) * 1000, 'p99_ms': percentile(samples, 0.99) * 1000,
+              'mean_ms': statistics.fmean(samples) * 1000}
+    print(f"{name:<22}{result['throughput_per_s']:>12.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+    return result
+
+
+def fetch(app, client, method, path, **kwargs):
+    """One test client request with its body read, in a fresh app context as a served request would have.
+
+    Requests made inside the benchmark's own long-lived app context would share its flask.g, and with it the
+    user Flask-Login cached for whichever client made the previous request.
+    """
+    with app.app_context():
+        response = client.open(BASE_URL + path, method=method, **kwargs)
+        response.get_data()
+        response.close()
+    return response
+
+
+def seed(db, User, Post, Log, passwords, logger, handler, users, posts, log_lines):
+    password_hash = passwords.hash(PASSWORD)  # one Argon2 hash shared by every seeded user
+    accounts = []
+    for i in range(users):
+        user = User(f'user{i}@example.com', 'Bench', 'User', '0191-1234567', password_hash)
+        user.mfa_enabled = True
+        user.role = 'sec_admin' if i == 0 else 'end_user'
+        accounts.append(user)
+    db.session.add_all(accounts)
+    db.session.commit()
+    db.session.add_all([Log(user.id) for user in accounts])
+    for i in range(posts):
+        author = accounts[i % users]
+        db.session.add(Post(author.id, author.encrypt(f'Post title {i}'), author.encrypt(f'Post body {i} ' * 20)))
+    db.session.commit()
+    # Written straight to the file in the handler's format, the handler's queue would drop a large seed.
+    with open(handler.filename, 'a', encoding='utf-8') as log_file:
+        for i in range(log_lines):
+            record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, "Unsuccessful Login Attempt", (),
+                                       None, extra={'email': f'user{i % users}@example.com', 'attempts': 1,
+                                                    'ip': f'10.0.{i // 256 % 256}.{i % 256}'})
+            log_file.write(handler.format(record) + '\n')
+    return [user.email for user in accounts]
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = []
+    print(f"\n{'benchmark':<22}{'base p50':>10}{'p50':>10}{'change':>9}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_ms'], result['p50_ms']
+        change = after / before - 1 if before else 0.0
+        flag = '  REGRESSION' if change > tolerance else ''
+        print(f"{name:<22}{before:>10.2f}{after:>10.2f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--log-lines', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from config import create_app, db, User, Post, Log, logger, passwords, login_throttle
+        from home.views import firewall
+        from security.log_reader import LogIndex
+
+        app = create_app(bench_config(tmp))
+        handler = app.extensions['security_log']
+        # A real TOTP code can roll over between generating and verifying it.
+        User.verify_pin = lambda self, pin: pin == PIN
+
+        with app.app_context():
+            db.create_all()
+            emails = seed(db, User, Post, Log, passwords, logger, handler, args.users, args.posts, args.log_lines)
+
+            def login(client, email):
+                return fetch(app, client, 'POST', '/login',
+                             data={'email': email, 'password': PASSWORD, 'pin': PIN})
+
+            def request(client, method, path, **kwargs):
+                def run():
+                    response = fetch(app, client, method, path, **kwargs)
+                    assert response.status_code < 400, (path, response.status_code)
+                return run
+
+            author, admin = app.test_client(), app.test_client()
+            login(author, emails[1])
+            login(admin, emails[0])
+            anonymous = app.test_client()
+
+            def login_round_trip():
+                response = login(anonymous, emails[2])
+                assert response.status_code == 302, response.status_code
+                fetch(app, anonymous, 'GET', '/logout')
+
+            user = db.session.get(User, 1)
+            token = user.encrypt('Post body ' * 20)
+            index = LogIndex(app.config['SECURITY_LOG_FILE'], app.config['SECURITY_LOG_INDEX'])
+            password_hash = user.password
+
+            def firewall_hook():
+                with app.test_request_context('/posts?q=hello+world&before=100'):
+                    firewall()
+
+            try:
+                print(f"{'benchmark':<22}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+                n = args.iterations
+                results = {
+                    'GET /posts': measure('GET /posts', request(author, 'GET', '/posts'), n),
+                    'POST /login': measure('POST /login', login_round_trip, max(10, n // 10)),
+                    'POST /create': measure('POST /create', request(author, 'POST', '/create',
+                                                                    data={'title': 'Benchmark', 'body': 'Body'}), n),
+                    'GET /security': measure('GET /security', request(admin, 'GET', '/security'), n),
+                    'firewall hook': measure('firewall hook', firewall_hook, n * 10),
+                    'User.encrypt': measure('User.encrypt', lambda: user.encrypt('Post body ' * 20), n * 10),
+                    'User.decrypt': measure('User.decrypt', lambda: user.decrypt(token), n * 10),
+                    'log index page': measure('log index page', lambda: (index.refresh(), index.page(limit=25)), n),
+                    'argon2 verify': measure('argon2 verify', lambda: passwords.verify(password_hash, PASSWORD),
+                                             max(10, n // 10)),
+                }
+            finally:
+                # Nothing may write into the temporary directory once it is gone.
+                handler.close()
+                login_throttle.persist_path = None
+                db.engine.dispose()
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'machine': platform.machine(), 'parameters': vars(args), 'results': results}
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Writing N posts through N sequential /create form posts against one /api/posts request.
+
+A temporary database is seeded as in bench_app.py and one end_user client writes every batch, so the posts
+table and its search index grow as they would for a user moving their blog here. Each line times writing N
+posts, with the resulting posts per second.
+
+Usage: python benchmarks/bench_bulk_posts.py [--iterations N] [sizes...]
+"""
+import argparse
+import tempfile
+
+from bench_app import PASSWORD, PIN, bench_config, fetch, measure, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('sizes', type=int, nargs='*', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from config import create_app, db, User, Post, Log, logger, passwords, login_throttle
+
+        app = create_app(bench_config(tmp))
+        handler = app.extensions['security_log']
+        User.verify_pin = lambda self, pin: pin == PIN
+        with app.app_context():
+            try:
+                db.create_all()
+                emails = seed(db, User, Post, Log, passwords, logger, handler, 10, 1000, 0)
+                client = app.test_client()
+                fetch(app, client, 'POST', '/login', data={'email': emails[1], 'password': PASSWORD, 'pin': PIN})
+                words = ' '.join(f'word{i}' for i in range(60))
+
+                def sequential(size):
+                    def write():
+                        for i in range(size):
+                            response = fetch(app, client, 'POST', '/create',
+                                             data={'title': f'Post title {i}', 'body': words})
+                            assert response.status_code == 302, response.status_code
+                    return write
+
+                def bulk(size):
+                    posts = [{'title': f'Post title {i}', 'body': words} for i in range(size)]
+
+                    def write():
+                        response = fetch(app, client, 'POST', '/api/posts', json=posts)
+                        assert response.status_code == 201, response.status_code
+                    return write
+
+                print(f"{'benchmark':<22}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+                for size in args.sizes:
+                    for label, write in (('create', sequential(size)), ('api', bulk(size))):
+                        result = measure(f'{size} posts {label}', write, args.iterations, warmup=1)
+                        print(f"{'':<22}{result['throughput_per_s'] * size:>12.0f} posts/s")
+            finally:
+                handler.close()
+                login_throttle.persist_path = None
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
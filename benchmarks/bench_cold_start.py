@@ -0,0 +1,41 @@
+"""Cold-start time of a fresh interpreter importing config.py (models only) and app.py (builds the app).
+
+Each run uses an empty temporary working directory, so the files any run writes can be listed. Optional
+extensions follow the environment, e.g. ADMIN_ENABLED=False QRCODE_ENABLED=False.
+
+Usage: python benchmarks/bench_cold_start.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def cold_start(tmp, module):
+    env = dict(os.environ, PYTHONPATH=ROOT, SECRET_KEY='benchmark',
+               SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp}/cold.sqlite")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=tmp, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for module in ('config', 'app'):
+        samples = []
+        written = set()
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as tmp:
+                samples.append(cold_start(tmp, module))
+                written.update(os.listdir(tmp))
+        print(f"import {module}: median {statistics.median(samples) * 1000:.0f} ms, "
+              f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms over {runs} runs, "
+              f"files written: {', '.join(sorted(written)) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
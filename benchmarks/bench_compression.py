@@ -0,0 +1,99 @@
+"""CPU cost against bytes saved for each available encoding and level, on real pages and admin static files.
+
+Pages are fetched uncompressed from the app built over a temporary seeded database (see bench_app.py). Each
+body is then compressed in process, one-shot and, for the streamed pages, in STREAM_BUFFER_SIZE chunks with
+a flush after each chunk as the compression middleware does. CPU time is process time.
+
+Usage: python benchmarks/bench_compression.py [min seconds per measurement]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from bench_app import PASSWORD, PIN, bench_config, fetch, seed
+
+from compression import AVAILABLE, ENCODINGS, compress
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 6, 11), 'zstd': (1, 3, 9, 19)}
+PAGES = (('author', '/posts', True), ('author', '/posts?limit=100', True), ('admin', '/security', True),
+         ('author', '/account', False))  # (client, path, streamed)
+STATIC_FILES = ('bootstrap/bootstrap4/css/bootstrap.min.css', 'vendor/jquery.min.js', 'admin/js/form.js')
+
+
+def cpu_time(function, min_seconds):
+    runs = 0
+    start = time.process_time()
+    while True:
+        function()
+        runs += 1
+        elapsed = time.process_time() - start
+        if elapsed >= min_seconds:
+            return elapsed / runs
+
+
+def compress_streamed(encoding, chunks, level):
+    encoder = ENCODINGS[encoding][0](level)
+    return b''.join([encoder.compress(chunk) + encoder.flush() for chunk in chunks] + [encoder.finish()])
+
+
+def fetch_bodies(tmp):
+    from config import create_app, db, User, Post, Log, logger, passwords, login_throttle
+
+    app = create_app(dict(bench_config(tmp), COMPRESSION_ENABLED=False, POSTS_MAX_PER_PAGE=100))
+    handler = app.extensions['security_log']
+    User.verify_pin = lambda self, pin: pin == PIN
+    bodies = {}
+    with app.app_context():
+        try:
+            db.create_all()
+            emails = seed(db, User, Post, Log, passwords, logger, handler, 50, 500, 2000)
+            clients = {'author': app.test_client(), 'admin': app.test_client()}
+            for name, email in (('author', emails[1]), ('admin', emails[0])):
+                fetch(app, clients[name], 'POST', '/login', data={'email': email, 'password': PASSWORD, 'pin': PIN})
+            for name, path, streamed in PAGES:
+                bodies[path] = (fetch(app, clients[name], 'GET', path).get_data(), streamed)
+            static_folder = app.blueprints['admin'].static_folder
+            for filename in STATIC_FILES:
+                with open(os.path.join(static_folder, filename), 'rb') as static_file:
+                    bodies[os.path.basename(filename)] = (static_file.read(), False)
+        finally:
+            handler.close()
+            login_throttle.persist_path = None
+            db.engine.dispose()
+    return bodies, app.config['STREAM_BUFFER_SIZE']
+
+
+def main():
+    min_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    encodings = [encoding for encoding in LEVELS if AVAILABLE[encoding]]
+    missing = [encoding for encoding in LEVELS if not AVAILABLE[encoding]]
+    with tempfile.TemporaryDirectory() as tmp:
+        bodies, chunk_size = fetch_bodies(tmp)
+
+    if missing:
+        print(f"not installed, skipped: {', '.join(missing)}")
+    print(f"{'body':<22}{'encoding':<16}{'KB':>8}{'ratio':>8}{'saved KB':>10}{'CPU ms':>9}{'MB/s':>8}"
+          f"{'us CPU/KB saved':>17}")
+    for name, (data, streamed) in bodies.items():
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        runs = [(encoding, level, False) for encoding in encodings for level in LEVELS[encoding]]
+        if streamed:
+            runs += [(encoding, level, True) for encoding in encodings for level in LEVELS[encoding]]
+        print(f"{name:<22}{'identity':<16}{len(data) / 1024:>8.1f}")
+        for encoding, level, chunked in runs:
+            if chunked:
+                encoded = compress_streamed(encoding, chunks, level)
+                seconds = cpu_time(lambda: compress_streamed(encoding, chunks, level), min_seconds)
+            else:
+                encoded = compress(encoding, data, level)
+                seconds = cpu_time(lambda: compress(encoding, data, level), min_seconds)
+            saved = len(data) - len(encoded)
+            label = f"{encoding} {level}{' chunked' if chunked else ''}"
+            print(f"{'':<22}{label:<16}{len(encoded) / 1024:>8.1f}{len(data) / len(encoded):>8.1f}"
+                  f"{saved / 1024:>10.1f}{seconds * 1000:>9.3f}{len(data) / seconds / 1e6:>8.1f}"
+                  f"{seconds * 1e6 / (saved / 1024):>17.2f}")
+
+
+if __name__ == '__main__':
+    main()
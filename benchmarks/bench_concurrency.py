@@ -0,0 +1,185 @@
+"""Throughput and latency of the sync and async serving modes with many concurrent clients.
+
+A temporary database is seeded as in bench_app.py and each mode is served from its own process:
+    sync    app.py's threaded Werkzeug server, or with --sync-threads a fixed pool of that many threads
+    async   asgi.py under uvicorn
+Each page is then requested by --clients clients at once for --seconds, from one asyncio load generator that
+opens a connection per request. Both servers use the same --pool-size database connection pool.
+
+Usage: python benchmarks/bench_concurrency.py [--clients 100 200] [--seconds 10] [--sync-threads N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_app import PASSWORD, PIN, bench_config, percentile, seed
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PAGES = (('author', '/posts'), ('author', '/account'), ('admin', '/security'))  # (client, path)
+
+
+def serve(mode, tmp, port, sync_threads):
+    from config import User
+
+    User.verify_pin = lambda self, pin: pin == PIN
+    if mode == 'async':
+        import uvicorn
+        from asgi import create_asgi_app
+
+        uvicorn.run(create_asgi_app(bench_config(tmp)), host='127.0.0.1', port=port, log_level='warning')
+        return
+
+    from werkzeug.serving import BaseWSGIServer, make_server
+    from config import create_app
+
+    app = create_app(bench_config(tmp))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if not sync_threads:
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+        return
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """Werkzeug's server with its requests handled by a fixed number of threads, as a threaded worker would."""
+
+        pool = ThreadPoolExecutor(max_workers=sync_threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.handle_in_pool, request, client_address)
+
+        def handle_in_pool(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', port, app)
+    server.request_queue_size = 1024
+    server.serve_forever()
+
+
+def seed_database(tmp):
+    from config import create_app, db, User, Post, Log, logger, passwords, login_throttle
+
+    app = create_app(bench_config(tmp))
+    handler = app.extensions['security_log']
+    with app.app_context():
+        try:
+            db.create_all()
+            return seed(db, User, Post, Log, passwords, logger, handler, 50, 2000, 20000)
+        finally:
+            handler.close()
+            login_throttle.persist_path = None
+            db.engine.dispose()
+
+
+async def http(port, method, path, cookie='', body=''):
+    """(status, headers, body length) of one request on a new connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    headers = [f'{method} {path} HTTP/1.1', f'Host: 127.0.0.1:{port}', 'Connection: close',
+               'X-Forwarded-Proto: https']  # Talisman redirects plain http
+    if cookie:
+        headers.append(f'Cookie: {cookie}')
+    if body:
+        headers += ['Content-Type: application/x-www-form-urlencoded', f'Content-Length: {len(body)}']
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n' + body).encode())
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    return int(lines[0].split()[1]), lines[1:], len(content)
+
+
+async def login(port, email):
+    status, headers, _ = await http(port, 'POST', '/login', body=f'email={email}&password={PASSWORD}&pin={PIN}')
+    assert status == 302, status
+    return '; '.join(line.split(':', 1)[1].split(';')[0].strip() for line in headers
+                     if line.lower().startswith('set-cookie:'))
+
+
+async def load(port, path, cookie, clients, seconds):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            try:
+                status, _, _ = await http(port, 'GET', path, cookie)
+            except OSError:
+                status = 0
+            if status == 200:
+                latencies.append(time.perf_counter() - began)
+            else:
+                errors += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return len(latencies) / (time.perf_counter() - began), latencies, errors
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as probe:
+            if probe.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def measure_mode(port, emails, clients, seconds):
+    cookies = {'author': await login(port, emails[1]), 'admin': await login(port, emails[0])}
+    rows = []
+    for name, path in PAGES:
+        await load(port, path, cookies[name], 10, 1)  # warm the caches and pools
+        for count in clients:
+            rows.append((path, count) + await load(port, path, cookies[name], count, seconds))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 200])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--sync-threads', type=int, default=0, help='Serve sync from this many threads.')
+    parser.add_argument('--pool-size', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8831)
+    parser.add_argument('--serve', nargs=2, metavar=('MODE', 'TMP'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], args.serve[1], args.port, args.sync_threads)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        emails = seed_database(tmp)
+        env = dict(os.environ, SQLALCHEMY_POOL_SIZE=str(args.pool_size))
+        print(f"{'mode':<8}{'page':<12}{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for mode in ('sync', 'async'):
+            server = subprocess.Popen([sys.executable, __file__, '--serve', mode, tmp, '--port', str(args.port),
+                                       '--sync-threads', str(args.sync_threads)], cwd=tmp, env=env)
+            try:
+                wait_for_port(args.port)
+                rows = asyncio.run(measure_mode(args.port, emails, args.clients, args.seconds))
+            finally:
+                server.terminate()
+                server.wait()
+            label = f'sync/{args.sync_threads}' if mode == 'sync' and args.sync_threads else mode
+            for path, count, throughput, latencies, errors in rows:
+                p50 = percentile(latencies, 0.5) * 1000 if latencies else float('nan')
+                p99 = percentile(latencies, 0.99) * 1000 if latencies else float('nan')
+                print(f"{label:<8}{path:<12}{count:>8}{throughput:>9.1f}{p50:>9.1f}{p99:>9.1f}{errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Per-request overhead of the request firewall, legacy hook vs. precompiled engine.
+
+Usage: python benchmarks/bench_firewall.py [iterations]
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from security.firewall import Firewall
+
+RULES = os.path.join(os.path.dirname(__file__), '..', 'firewall_rules.json')
+
+INPUTS = {
+    'clean': ('/posts', 'before=1200&limit=20'),
+    'clean long query': ('/posts', '&'.join(f'param{i}=value{i}' for i in range(50))),
+    'sql injection': ('/posts', 'q=1%20union%20select%20password%20from%20users'),
+    'path traversal': ('/static/../../etc/passwd', ''),
+}
+
+
+def legacy_firewall(path, query_string):
+    conditions = {
+        "SQL Injection": re.compile(r"union|select|insert|drop|alter|;|`|'", re.IGNORECASE),
+        "XXS": re.compile(r"<script>|<iframe>|%3Cscript%3C|%3Ciframe%3C", re.IGNORECASE),
+        "Path Traversal": re.compile(r"\.\./|\.\.|%2e%2e%2f|%2e%2e/|\.\.%2f", re.IGNORECASE)
+    }
+    for attack_type, attack_pattern in conditions.items():
+        if attack_pattern.search(path) or attack_pattern.search(query_string):
+            return attack_type
+    return None
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    engine = Firewall.from_file(RULES)
+
+    print(f"{'input':<20}{'legacy (us)':>14}{'engine (us)':>14}{'speedup':>10}")
+    for name, (path, query_string) in INPUTS.items():
+        assert legacy_firewall(path, query_string) == engine.check(path, query_string)
+        legacy = timeit.timeit(lambda: legacy_firewall(path, query_string), number=iterations) / iterations
+        fast = timeit.timeit(lambda: engine.check(path, query_string), number=iterations) / iterations
+        print(f"{name:<20}{legacy * 1e6:>14.2f}{fast * 1e6:>14.2f}{legacy / fast:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
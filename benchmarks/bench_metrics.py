@@ -0,0 +1,56 @@
+"""Overhead of the request metrics: the same requests with metrics off, on, and on with Server-Timing.
+
+Uses the temporary database and seeding from bench_app.py. The modes are interleaved request by request, so
+drift over the run (warm caches, a growing database) does not show up as overhead.
+
+Usage: python benchmarks/bench_metrics.py [iterations]
+"""
+import sys
+import tempfile
+import time
+
+from bench_app import PASSWORD, PIN, bench_config, fetch, percentile, seed
+
+MODES = (('off', False, False), ('on', True, False), ('on + Server-Timing', True, True))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        from config import create_app, db, User, Post, Log, logger, passwords, login_throttle, metrics
+
+        flask_app = create_app(bench_config(tmp))
+        handler = flask_app.extensions['security_log']
+        User.verify_pin = lambda self, pin: pin == PIN
+
+        with flask_app.app_context():
+            try:
+                db.create_all()
+                emails = seed(db, User, Post, Log, passwords, logger, handler, 20, 500, 0)
+                client = flask_app.test_client()
+                fetch(flask_app, client, 'POST', '/login', data={'email': emails[1], 'password': PASSWORD, 'pin': PIN})
+
+                print(f"{'benchmark':<38}{'p50 ms':>10}{'p99 ms':>10}")
+                for path in ('/', '/posts'):
+                    samples = {mode: [] for mode, _, _ in MODES}
+                    for i in range(iterations + 10):
+                        for mode, enabled, server_timing in MODES:
+                            metrics.enabled, metrics.server_timing = enabled, server_timing
+                            began = time.perf_counter()
+                            fetch(flask_app, client, 'GET', path)
+                            if i >= 10:  # warm-up
+                                samples[mode].append(time.perf_counter() - began)
+                    p50 = {mode: percentile(samples[mode], 0.5) * 1000 for mode in samples}
+                    for mode in samples:
+                        print(f"{f'GET {path} metrics {mode}':<38}{p50[mode]:>10.3f}"
+                              f"{percentile(samples[mode], 0.99) * 1000:>10.3f}")
+                    overhead = p50['on'] - p50['off']
+                    print(f"{'  overhead':<38}{overhead * 1000:>10.1f} us/request ({overhead / p50['off']:+.1%})")
+            finally:
+                handler.close()
+                login_throttle.persist_path = None
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Per-request cost of checking a rate limit against each limiter storage backend.
+
+Also runs several processes against the shared SQLite backend and checks that no hits are lost.
+
+Usage: python benchmarks/bench_ratelimit.py [iterations] [processes]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import limiter_storage  # noqa: F401  registers sqlite://
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+LIMITS = [parse("500/day"), parse("20/minute")]
+
+
+def hit_many(uri, iterations, keys=100):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    start = time.perf_counter()
+    for i in range(iterations):
+        for limit in LIMITS:
+            limiter.hit(limit, f"10.0.{i % keys // 256}.{i % 256}")
+    return time.perf_counter() - start
+
+
+def shared_worker(uri, iterations):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    for _ in range(iterations):
+        limiter.hit(parse("1000000/day"), "shared")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_uri = f"sqlite:///{tmp}/ratelimit.db"
+
+        print(f"{'backend':<12}{'us/request':>12}")
+        for name, uri in (('memory', 'memory://'), ('sqlite', sqlite_uri)):
+            elapsed = hit_many(uri, iterations)
+            print(f"{name:<12}{elapsed / iterations * 1e6:>12.1f}")
+
+        workers = [multiprocessing.Process(target=shared_worker, args=(sqlite_uri, iterations))
+                   for _ in range(processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        counted = storage_from_string(sqlite_uri).get("LIMITER/shared/1000000/1/day")
+        print(f"\n{processes} processes x {iterations} hits on sqlite: {counted} counted "
+              f"(expected {processes * iterations}) in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
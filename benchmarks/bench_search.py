@@ -0,0 +1,65 @@
+"""Post search latency through the blind index as the number of posts grows.
+
+For each size a temporary database is filled with posts of random words drawn from a vocabulary with a
+few very common words, and indexed the way `flask data reindex` does. The search then runs for a common
+word, a rare word and a three-word query. Only the index is exercised, the posts themselves are not
+encrypted.
+
+Usage: python benchmarks/bench_search.py [sizes...]
+"""
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+from bench_app import bench_config, measure
+
+COMMON = ['the', 'and', 'blog', 'post']
+
+
+def fill(db, Post, PostTerm, blind_index, count, words):
+    rng = random.Random(count)
+    now = datetime.now()
+    posts, terms = [], []
+    for post_id in range(1, count + 1):
+        title = ' '.join(rng.choices(words, k=5))
+        body = ' '.join(COMMON + rng.choices(words, k=60))
+        posts.append({'id': post_id, 'userid': 1, 'created': now, 'title': '', 'body': ''})
+        terms += [{'token': token, 'post_id': post_id, 'weight': weight}
+                  for token, weight in blind_index.weights(title, body).items()]
+    db.session.execute(db.insert(Post), posts)
+    db.session.execute(db.insert(PostTerm), terms)
+    db.session.commit()
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 50000]
+    words = [f'word{i}' for i in range(5000)]
+    print(f"{'benchmark':<22}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            from config import create_app, db, Post, PostTerm, blind_index, login_throttle
+
+            app = create_app(bench_config(tmp))
+            with app.app_context():
+                try:
+                    db.create_all()
+                    fill(db, Post, PostTerm, blind_index, size, words)
+                    config = app.config
+
+                    def search(query):
+                        tokens = blind_index.query_tokens(query, config['SEARCH_MAX_TERMS'])
+                        return lambda: PostTerm.search(tokens, config['SEARCH_RESULTS'],
+                                                       config['SEARCH_MAX_POSTINGS'])
+
+                    for label, query in (('common', 'blog'), ('rare', 'word4321'),
+                                         ('3 words', 'blog word12 word4321')):
+                        measure(f'{size} posts {label}', search(query), 200)
+                finally:
+                    app.extensions['security_log'].close()
+                    login_throttle.persist_path = None
+                    db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
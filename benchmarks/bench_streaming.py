@@ -0,0 +1,132 @@
+"""Time to first byte, total time and peak RSS of large /posts and /security pages.
+
+A temporary database is seeded with --posts posts and --users users, and the page limits are raised so one
+page holds --page-size rows. Each page is measured in its own interpreter, so the peak RSS of one does not
+hide the other's, and the Python heap peak of a single request is traced separately. The first request
+renders every card, later ones hit the card cache.
+
+--root imports the app from another checkout, so a before/after comparison is e.g.:
+    git worktree add /tmp/before <commit>
+    python benchmarks/bench_streaming.py --root /tmp/before
+    python benchmarks/bench_streaming.py
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_app import BASE_URL, PASSWORD, PIN, bench_config, percentile, seed
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def page_config(tmp, page_size):
+    return dict(bench_config(tmp), POSTS_MAX_PER_PAGE=page_size, SECURITY_USERS_PER_PAGE=page_size)
+
+
+def seed_database(tmp, users, posts):
+    from config import create_app, db, User, Post, Log, logger, passwords, login_throttle
+
+    app = create_app(page_config(tmp, posts))
+    handler = app.extensions['security_log']
+    with app.app_context():
+        try:
+            db.create_all()
+            seed(db, User, Post, Log, passwords, logger, handler, 20, posts, 1000)
+            # The rest of the users only fill the security page, so they get no posts and no keys derived.
+            password_hash = passwords.hash(PASSWORD)
+            extra = [User(f'extra{i}@example.com', 'Bench', 'User', '0191-1234567', password_hash)
+                     for i in range(users - 20)]
+            db.session.add_all(extra)
+            db.session.commit()
+            db.session.add_all([Log(user.id) for user in extra])
+            db.session.commit()
+        finally:
+            handler.close()
+            login_throttle.persist_path = None
+            db.engine.dispose()
+
+
+def measure_page(tmp, path, email, page_size, iterations):
+    from config import create_app, db, User, login_throttle
+
+    app = create_app(page_config(tmp, page_size))
+    handler = app.extensions['security_log']
+    User.verify_pin = lambda self, pin: pin == PIN
+    with app.app_context():
+        try:
+            client = app.test_client()
+            client.post(BASE_URL + '/login', data={'email': email, 'password': PASSWORD, 'pin': PIN})
+            client.get(BASE_URL + path.split('?')[0], buffered=True)  # warm up on a normal sized page
+
+            first_bytes, totals, size = [], [], 0
+            for _ in range(iterations + 1):
+                began = time.perf_counter()
+                response = client.get(BASE_URL + path)
+                chunks = iter(response.response)
+                size = len(next(chunk for chunk in chunks if chunk))
+                first_bytes.append(time.perf_counter() - began)
+                size += sum(len(chunk) for chunk in chunks)
+                totals.append(time.perf_counter() - began)
+                response.close()
+            assert response.status_code == 200, response.status_code
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            # Python heap high-water mark of one more request, traced on its own as tracing slows it down.
+            tracemalloc.start()
+            response = client.get(BASE_URL + path)
+            for _ in response.response:
+                pass
+            response.close()
+            peak_heap = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            handler.close()
+            login_throttle.persist_path = None
+            db.engine.dispose()
+    return {'bytes': size, 'first_ttfb_ms': first_bytes[0] * 1000, 'first_total_ms': totals[0] * 1000,
+            'ttfb_p50_ms': percentile(first_bytes[1:], 0.5) * 1000,
+            'total_p50_ms': percentile(totals[1:], 0.5) * 1000, 'peak_rss_mb': peak_rss / 1024,
+            'peak_heap_mb': peak_heap / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--root', default=ROOT, help='Checkout to import the app from.')
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--worker', nargs=2, metavar=('TMP', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.root))
+
+    if args.worker:
+        tmp, path = args.worker
+        email = 'user0@example.com' if path.startswith('/security') else 'user1@example.com'
+        print(json.dumps(measure_page(tmp, path, email, args.page_size, args.iterations)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_database(tmp, args.users, args.posts)
+        print(f"{args.root}: {args.posts} posts, {args.users} users, {args.page_size} rows per page")
+        print(f"{'page':<22}{'KB':>8}{'TTFB 1st':>10}{'total 1st':>11}{'TTFB p50':>10}{'total p50':>11}"
+              f"{'peak RSS MB':>13}{'request heap MB':>17}")
+        for path in (f'/posts?limit={args.page_size}', '/security'):
+            output = subprocess.run([sys.executable, __file__, '--root', args.root, '--page-size',
+                                     str(args.page_size), '--iterations', str(args.iterations),
+                                     '--worker', tmp, path],
+                                    cwd=tmp, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(f"{path.split('?')[0]:<22}{result['bytes'] / 1024:>8.0f}{result['first_ttfb_ms']:>10.1f}"
+                  f"{result['first_total_ms']:>11.1f}{result['ttfb_p50_ms']:>10.1f}{result['total_p50_ms']:>11.1f}"
+                  f"{result['peak_rss_mb']:>13.1f}{result['peak_heap_mb']:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Show the SQLite query plans for the hot queries and fail if any of them scans a whole table.
+
+Run against the configured database (SQLALCHEMY_DATABASE_URI), after `flask db upgrade`:
+    python benchmarks/query_plans.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import desc, select
+from sqlalchemy.orm import contains_eager, joinedload
+
+from config import create_app, db, Log, Post, User
+
+QUERIES = {
+    'posts feed (next page)': select(Post).options(joinedload(Post.user))
+                                          .where(Post.id < 1000).order_by(desc(Post.id)).limit(21),
+    'posts feed (previous page)': select(Post).options(joinedload(Post.user))
+                                              .where(Post.id > 1000).order_by(Post.id).limit(21),
+    'account posts': select(Post).where(Post.userid == 1).order_by(Post.id),
+    'security users by latest login': select(Log).join(Log.user).options(contains_eager(Log.user))
+                                                 .order_by(desc(Log.latest_login), desc(Log.id)).limit(50),
+    'security users by role': select(Log).join(Log.user).options(contains_eager(Log.user))
+                                         .where(User.role == 'end_user').order_by(User.role, Log.id).limit(50),
+    'security users by ip': select(Log).join(Log.user).options(contains_eager(Log.user))
+                                       .where(Log.latest_login_ip == '127.0.0.1').limit(50),
+    'login': select(User).where(User.email == 'user@example.com'),
+}
+
+
+def full_scans(plan):
+    # 'SCAN t' without an index is a full table scan; 'SCAN t USING INDEX' walks an index in order.
+    return [detail for detail in plan if detail.startswith('SCAN') and 'USING' not in detail]
+
+
+def main():
+    failed = False
+    with create_app().app_context():
+        for name, query in QUERIES.items():
+            sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+            scans = full_scans(plan)
+            failed = failed or bool(scans)
+            print(f"{'FAIL' if scans else 'ok':<6}{name}")
+            for detail in plan:
+                print(f"        {detail}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
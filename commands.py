@@ -0,0 +1,175 @@
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.orm import joinedload
+
+from compression import compress_static
+from config import db, User, Log, Post, PostTerm, KeyRotation, FeedVersion, blind_index, compression
+
+data_cli = AppGroup('data', help='Bulk export and import of users, logs and posts.')
+static_cli = AppGroup('static', help='Static file tasks.')
+
+TABLES = {'users': User.__table__, 'logs': Log.__table__, 'posts': Post.__table__}
+# Core inserts skip the mapper events that bump feed versions, so import bumps them itself.
+FEEDS = {'users': 'security', 'logs': 'security', 'posts': 'posts'}
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        # Fernet tokens are stored as bytes, they are URL-safe base64 so decode losslessly.
+        return value.decode()
+    return value
+
+
+def decode_value(column, value):
+    if value is None or value == '':
+        return None if column.nullable else value
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is bool:
+        return value if isinstance(value, bool) else value in ('True', 'true', '1')
+    if python_type is int:
+        return int(value)
+    return value
+
+
+def read_records(source, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(source)
+    else:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+@data_cli.command('export')
+@click.argument('table', type=click.Choice(TABLES))
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(['jsonl', 'csv']), default='jsonl')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--decrypt-for', metavar='EMAIL',
+              help='Export only this user\'s posts, decrypted with their key. Output cannot be re-imported.')
+def export_table(table, output, file_format, batch_size, decrypt_for):
+    """Stream TABLE to a JSON Lines or CSV file in primary key order."""
+    model = TABLES[table]
+    query = select(model).order_by(model.c.id)
+
+    fernet = None
+    if decrypt_for:
+        if table != 'posts':
+            raise click.UsageError('--decrypt-for only applies to posts')
+        user = User.query.filter_by(email=decrypt_for).first()
+        if not user:
+            raise click.BadParameter(f'no user with email {decrypt_for}', param_hint='--decrypt-for')
+        fernet = user.fernet
+        query = query.where(model.c.userid == user.id)
+
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=[column.name for column in model.columns])
+        writer.writeheader()
+
+    count = 0
+    # yield_per streams rows with a server-side cursor, Core rows keep the identity map empty.
+    for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+        record = {name: encode_value(value) for name, value in row._mapping.items()}
+        if fernet:
+            record['title'] = fernet.decrypt(record['title']).decode()
+            record['body'] = fernet.decrypt(record['body']).decode()
+        if writer:
+            writer.writerow(record)
+        else:
+            output.write(json.dumps(record) + '\n')
+        count += 1
+    click.echo(f'Exported {count} {table}.', err=True)
+
+
+@data_cli.command('import')
+@click.argument('table', type=click.Choice(TABLES))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['jsonl', 'csv']), default='jsonl')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_table(table, source, file_format, batch_size):
+    """Load TABLE from a file written by `flask data export`, committing every batch.
+
+    Import users before logs and posts so foreign keys resolve.
+    """
+    model = TABLES[table]
+    records = read_records(source, file_format)
+    count = 0
+    while True:
+        batch = [{column.name: decode_value(column, record.get(column.name)) for column in model.columns}
+                 for record in islice(records, batch_size)]
+        if not batch:
+            break
+        db.session.execute(model.insert(), batch)
+        FeedVersion.bump(db.session.connection(), FEEDS[table])
+        db.session.commit()
+        count += len(batch)
+    click.echo(f'Imported {count} {table}.', err=True)
+
+
+@data_cli.command('rekey')
+@click.option('--batch-size', type=int, help='Posts per transaction, defaults to REKEY_BATCH_SIZE.')
+def rekey(batch_size):
+    """Finish every pending post re-encryption left behind by password changes."""
+    batch_size = batch_size or current_app.config['REKEY_BATCH_SIZE']
+    user_ids = db.session.scalars(select(KeyRotation.user_id)).all()
+    for user_id in user_ids:
+        db.session.get(KeyRotation, user_id).run(batch_size)
+    click.echo(f'Re-encrypted posts for {len(user_ids)} users.', err=True)
+
+
+@data_cli.command('reindex')
+@click.option('--batch-size', type=int, help='Posts per transaction, defaults to REINDEX_BATCH_SIZE.')
+@click.option('--rebuild', is_flag=True, help='Drop the whole index first, e.g. after changing BLIND_INDEX_KEY.')
+def reindex(batch_size, rebuild):
+    """Build the search index of every post that has none, a batch per transaction.
+
+    Posts created through the app are indexed as they are written, this is for imported posts and posts
+    written before the index existed. Stopping part way loses at most the batch in progress.
+    """
+    batch_size = batch_size or current_app.config['REINDEX_BATCH_SIZE']
+    if rebuild:
+        db.session.execute(delete(PostTerm))
+        db.session.commit()
+    unindexed = ~exists().where(PostTerm.post_id == Post.id)
+    last_id = 0
+    count = 0
+    while True:
+        posts = db.session.scalars(select(Post).options(joinedload(Post.user)).where(Post.id > last_id, unindexed)
+                                   .order_by(Post.id).limit(batch_size)).all()
+        if not posts:
+            break
+        rows = []
+        for post in posts:
+            fernet = post.user.fernet  # derived once per author, then served from the key cache
+            weights = blind_index.weights(fernet.decrypt(post.title).decode(), fernet.decrypt(post.body).decode())
+            rows += [{'token': token, 'post_id': post.id, 'weight': weight} for token, weight in weights.items()]
+        if rows:
+            db.session.execute(insert(PostTerm), rows)
+        FeedVersion.bump(db.session.connection(), 'posts')
+        db.session.commit()
+        last_id = posts[-1].id
+        count += len(posts)
+    click.echo(f'Indexed {count} posts.', err=True)
+
+
+@static_cli.command('compress')
+def compress():
+    """Write compressed copies of the static files, served in place of the files to clients that accept them.
+
+    Run after installing or upgrading packages that ship static files, such as Flask-Admin.
+    """
+    written, original_bytes, compressed_bytes = compress_static(current_app, compression)
+    click.echo(f'Wrote {written} compressed files under {compression.static_dir}'
+               f' ({original_bytes / 1024:.0f} KB -> {compressed_bytes / 1024:.0f} KB).', err=True)
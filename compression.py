@@ -0,0 +1,253 @@
+import mimetypes
+import os
+import zlib
+
+import flask
+from flask import current_app, send_file
+
+# brotli and zstd are optional, gzip is always available.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipEncoder:
+    max_level = 9
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+    @staticmethod
+    def compress_all(data, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+
+class BrotliEncoder:
+    max_level = 11
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+    @staticmethod
+    def compress_all(data, level):
+        return brotli.compress(data, quality=level)
+
+
+class ZstdEncoder:
+    max_level = 19
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+    @staticmethod
+    def compress_all(data, level):
+        # One-shot compression knows the input size and sizes its window to it, a stream cannot.
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# Content-Encoding name: (encoder, file extension of pre-compressed static files)
+ENCODINGS = {'br': (BrotliEncoder, '.br'), 'zstd': (ZstdEncoder, '.zst'), 'gzip': (GzipEncoder, '.gz')}
+AVAILABLE = {'br': brotli is not None, 'zstd': zstandard is not None, 'gzip': True}
+
+
+def compress(encoding, data, level):
+    return ENCODINGS[encoding][0].compress_all(data, level)
+
+
+def compress_chunks(chunks, encoder):
+    """Compress a streamed body, flushing after every chunk so each one still reaches the client straight away."""
+    try:
+        for chunk in chunks:
+            data = encoder.compress(chunk.encode() if isinstance(chunk, str) else chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+class Compression:
+    """Content-Encoding for responses, negotiated from Accept-Encoding.
+
+    Dynamic responses of a compressible type are compressed at COMPRESSION_LEVELS, streamed ones chunk by
+    chunk, except pages that rendered a CSRF token. Static files are not compressed per request: `flask static compress` writes a compressed copy of
+    each one at the highest level under COMPRESSION_STATIC_DIR, and those copies are sent where they exist
+    and are newer than the file.
+    """
+
+    def __init__(self):
+        self.encodings = []
+        self.levels = {}
+        self.min_size = 0
+        self.mimetypes = set()
+        self.static_dir = None
+
+    def init_app(self, app):
+        self.encodings = [encoding for encoding in app.config['COMPRESSION_ENCODINGS']
+                          if encoding in ENCODINGS and AVAILABLE[encoding]]
+        self.levels = app.config['COMPRESSION_LEVELS']
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.mimetypes = set(app.config['COMPRESSION_MIMETYPES'])
+        self.static_dir = os.path.abspath(app.config['COMPRESSION_STATIC_DIR'])
+        if app.config['COMPRESSION_ENABLED']:
+            app.after_request(self._after_request)
+
+    def compressible(self, mimetype):
+        return mimetype in self.mimetypes
+
+    def _after_request(self, response):
+        request = flask.request
+        if (not self.compressible(response.mimetype) or response.status_code < 200
+                or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        # BREACH: the compressed size of a page holding the session's CSRF token next to text the client sent
+        # (e.g. a re-shown form) leaks the token, so pages that rendered one are sent uncompressed.
+        if current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in flask.g:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if response.direct_passthrough:
+            return self._static_response(response) if 'Range' not in request.headers else response
+
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, ENCODINGS[encoding][0](self.levels[encoding]))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compress(encoding, data, self.levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different byte sequence, so a strong validator becomes weak.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _static_response(self, response):
+        """Swap a static file response for its pre-compressed copy, if there is one the client accepts."""
+        source = static_source()
+        if source is None:
+            return response
+        name, folder, filename = source
+        variants = {}
+        for encoding in self.encodings:
+            path = static_variant_path(self.static_dir, name, filename, encoding)
+            try:
+                if os.stat(path).st_mtime >= os.stat(os.path.join(folder, filename)).st_mtime:
+                    variants[encoding] = path
+            except OSError:
+                continue
+        encoding = flask.request.accept_encodings.best_match(list(variants))
+        if encoding is None:
+            return response
+
+        compressed = send_file(variants[encoding], mimetype=response.mimetype, conditional=False, etag=False,
+                               max_age=current_app.get_send_file_max_age(filename))
+        compressed.headers['Content-Encoding'] = encoding
+        compressed.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        if etag:
+            compressed.set_etag(f'{etag}-{encoding}', weak=weak)
+        compressed.last_modified = response.last_modified
+        response.close()
+        return compressed.make_conditional(flask.request)
+
+
+def static_source():
+    """(app or blueprint name, static folder, filename) of the current request if it is for a static file."""
+    endpoint = flask.request.endpoint or ''
+    if endpoint == 'static':
+        name, folder = 'app', current_app.static_folder
+    elif endpoint.endswith('.static'):
+        name = endpoint.rsplit('.', 1)[0]
+        folder = current_app.blueprints[name].static_folder
+    else:
+        return None
+    return name, folder, flask.request.view_args['filename']
+
+
+def static_folders(app):
+    """Every static folder the app serves from, keyed by the app or blueprint name."""
+    folders = {'app': app.static_folder} if app.has_static_folder else {}
+    folders.update({name: blueprint.static_folder for name, blueprint in app.blueprints.items()
+                    if blueprint.has_static_folder})
+    return folders
+
+
+def static_variant_path(static_dir, name, filename, encoding):
+    return os.path.join(static_dir, name, filename + ENCODINGS[encoding][1])
+
+
+def compress_static(app, compression):
+    """Write a compressed copy of every compressible static file, for each available encoding.
+
+    Copies that are up to date are kept, and copies no smaller than the file are not written.
+    Returns (files written, bytes of the files, bytes of the copies written).
+    """
+    written = original_bytes = compressed_bytes = 0
+    for name, folder in static_folders(app).items():
+        for directory, _, names in os.walk(folder):
+            for file_name in names:
+                source = os.path.join(directory, file_name)
+                filename = os.path.relpath(source, folder)
+                mimetype = mimetypes.guess_type(file_name)[0]
+                size = os.path.getsize(source)
+                if not compression.compressible(mimetype) or size < compression.min_size:
+                    continue
+                data = None
+                for encoding in compression.encodings:
+                    path = static_variant_path(compression.static_dir, name, filename, encoding)
+                    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+                        continue
+                    if data is None:
+                        with open(source, 'rb') as source_file:
+                            data = source_file.read()
+                    encoded = compress(encoding, data, ENCODINGS[encoding][0].max_level)
+                    if len(encoded) >= size:
+                        continue
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as variant_file:
+                        variant_file.write(encoded)
+                    written += 1
+                    original_bytes += size
+                    compressed_bytes += len(encoded)
+    return written, original_bytes, compressed_bytes
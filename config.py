@@ -1,43 +1,49 @@
+import atexit
 import base64
+import hashlib
+import hmac
 import logging
 import os
-from functools import wraps
-from dotenv import load_dotenv, set_key
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from dotenv import load_dotenv
 
 import flask
 import pyotp
-from cryptography.fernet import Fernet
-from flask import Flask, url_for, redirect, flash, render_template
-
-from flask_admin import Admin
-from flask_admin.contrib.sqla import ModelView
-from flask_admin.menu import MenuLink
+from cryptography.fernet import Fernet, MultiFernet
+from flask import Flask, url_for, redirect, flash, current_app
 import secrets
 
 import flask_login
 from flask_login import LoginManager, UserMixin
-from flask_qrcode import QRcode
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_talisman import Talisman
-from sqlalchemy import MetaData
-from datetime import datetime
+from sqlalchemy import MetaData, bindparam, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from argon2 import PasswordHasher
 from hashlib import scrypt
-
-load_dotenv()
-app = Flask(__name__)
-
-# CAPTCHA KEYS
-app.config['RECAPTCHA_PUBLIC_KEY'] = os.getenv('RECAPTCHA_PUBLIC_KEY')
-app.config['RECAPTCHA_PRIVATE_KEY'] = os.getenv('RECAPTCHA_PRIVATE_KEY')
-
-# DATABASE CONFIGURATION
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
-app.config['SQLALCHEMY_ECHO'] = (os.getenv('SQLALCHEMY_ECHO') == "True")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = (os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS') == "True")
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+
+from accounts.passwords import PasswordService
+from accounts.throttle import LoginThrottle
+from async_db import AsyncDatabase, async_url
+from cache import LRUCache
+from compression import Compression
+import limiter_storage  # registers the sqlite:// rate limit storage scheme
+from metrics import Metrics
+from search import BlindIndex
+from security.log_writer import BatchingFileHandler, JsonFormatter
+
+# Extensions are created unbound here and services are created per app by create_app(), so importing this
+# module (models, CLI commands, scripts) builds no app and writes no files.
 
 metadata = MetaData(
     naming_convention={
@@ -49,41 +55,135 @@ metadata = MetaData(
     }
 )
 
-db = SQLAlchemy(app, metadata=metadata)
-migrate = Migrate(app, db)
+db = SQLAlchemy(metadata=metadata)
+migrate = Migrate()
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record, mmap_size):
+    # Listened for on SQLite engines only, the connection is sqlite3's or the async driver's adapter of it.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    cursor.close()
+
+
+def extension(name):
+    """The current app's instance of a service kept in app.extensions[name] by create_app()."""
+    return LocalProxy(lambda: current_app.extensions[name])
+
+
+# INIT ASYNC DATABASE
+# Used only by the async views, which asgi.py switches on.
+async_db = extension('async_db')
+
 
 # CREATE LOGIN MANAGER
 login_manager = LoginManager()
 login_manager.login_view = 'accounts.login'
 login_manager.login_message_category = 'info'
-login_manager.init_app(app)
+login_manager.blueprint_login_views = {'posts_api': None}  # the JSON API answers 401 rather than redirecting
 
-# INIT QRCODE
-qrcode = QRcode(app)
+# RATE LIMITING
+limiter = Limiter(key_func=get_remote_address, default_limits=["500/day"])
 
-# INIT LOGGER
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("Security Log")
-handler = logging.FileHandler('security.log')
-handler.setLevel(0)
-formatter = logging.Formatter('%(asctime)s : %(message)s', '%d/%m/%Y %I:%M:%S %p')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+def current_user_key():
+    """Rate limit key of the logged in user, or of the client's address before login."""
+    user = flask_login.current_user
+    return f'user:{user.id}' if user.is_authenticated else get_remote_address()
+
+
+# SETUP TALISMAN
+csp = {
+    'xyz-src': ['\'self\''],
+    'style-src': ["https://cdn.jsdelivr.net/npm/bootstrap@4.6.2/dist/css/bootstrap.min.css",
+                  "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/swatch/default/bootstrap.min.css?v=4.2.1",
+                "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/css/bootstrap.min.css?v=4.2.1",
+                  "http://127.0.0.1:5000/admin/static/admin/css/bootstrap4/admin.css?v=1.1.1",
+                  "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/css/font-awesome.min.css?v=4.7.0",
+                  "http://127.0.0.1:5000/admin/static/vendor/select2/select2.css?v=4.2.1",
+                  "http://127.0.0.1:5000/admin/static/vendor/select2/select2-bootstrap4.css?v=1.4.6",
+                  "http://127.0.0.1:5000/admin/static/vendor/bootstrap-daterangepicker/daterangepicker-bs4.css?v=1.3.22"],
+    'script-src': ["https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/js/bootstrap.bundle.min.js",
+                   "https://www.google.com/recaptcha/",
+                   "https://www.gstatic.com/recaptcha/"],
+    'frame-src': ["https://www.google.com/recaptcha/",
+                  "https://www.gstatic.com/recaptcha/"]
+}
 
 # INIT HASHING
+# The Argon2 parameters are shared, each app's PasswordService runs them on a worker pool of its own.
 ph = PasswordHasher()
 
+# PER-APP SERVICES
+# Each app made by create_app() has its own, these names reach the current app's.
+logger = extension('security_logger')
+metrics = extension('metrics')
+compression = extension('compression')
+blind_index = extension('blind_index')
+passwords = extension('passwords')
+login_throttle = extension('login_throttle')
+key_cache = extension('key_cache')
+# Rendered cards hold plaintext, so they live in process memory only and are dropped on logout and shutdown.
+card_cache = extension('card_cache')
+# Snapshots used by the login user loader. Changes made through the ORM evict them straight away,
+# the short TTL bounds staleness from other workers or out-of-band updates.
+identity_cache = extension('identity_cache')
+
+# INIT POST RE-ENCRYPTION
+# After a password change a user's posts are moved to the new key in the background, REKEY_BATCH_SIZE
+# posts per transaction, with a checkpoint in key_rotations so an interrupted job picks up where it stopped.
+rekey_lock = threading.Lock()
+
+
+def rekey_executor():
+    with rekey_lock:
+        if 'rekey_executor' not in current_app.extensions:
+            current_app.extensions['rekey_executor'] = ThreadPoolExecutor(
+                max_workers=current_app.config['REKEY_WORKERS'], thread_name_prefix='post-rekey')
+        return current_app.extensions['rekey_executor']
+
+
+def schedule_rotation(user_id):
+    """Queue the re-encryption of a user's posts, unless it is already queued or running in this app."""
+    rekey_running = current_app.extensions['rekey_running']
+    with rekey_lock:
+        if user_id in rekey_running:
+            return
+        rekey_running.add(user_id)
+    rekey_executor().submit(run_rotation, current_app._get_current_object(), user_id)
+
+
+def run_rotation(app, user_id):
+    try:
+        with app.app_context():
+            rotation = db.session.get(KeyRotation, user_id)
+            if rotation:
+                rotation.run(app.config['REKEY_BATCH_SIZE'])
+    except Exception:
+        app.logger.exception("Re-encrypting posts for user %s failed, it resumes on their next login", user_id)
+    finally:
+        with rekey_lock:
+            app.extensions['rekey_running'].discard(user_id)
+
+
+def drop_cached_plaintext(user_id):
+    key_cache.discard_where(lambda key: key[0] == user_id)
+    card_cache.discard_where(lambda key: key[2] == user_id)
+
 
 # DATABASE TABLES
 class Post(db.Model):
     __tablename__ = 'posts'
 
     id = db.Column(db.Integer, primary_key=True)
-    userid = db.Column(db.Integer, db.ForeignKey('users.id'))
-    created = db.Column(db.DateTime, nullable=False)
+    userid = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    created = db.Column(db.DateTime, nullable=False, index=True)
     title = db.Column(db.Text, nullable=False)
     body = db.Column(db.Text, nullable=False)
     user = db.relationship("User", back_populates="posts")
+    terms = db.relationship("PostTerm", cascade="all, delete-orphan")
 
     def __init__(self, userid, title, body):
         self.created = datetime.now()
@@ -91,12 +191,51 @@ class Post(db.Model):
         self.body = body
         self.userid = userid
 
+    @property
+    def card_key(self):
+        return self.id, self.created, self.userid
+
     def update(self, title, body):
+        card_cache.discard(self.card_key)
         self.created = datetime.now()
         self.title = title
         self.body = body
         db.session.commit()
 
+    def index_terms(self, title, body):
+        """Replace the post's search index rows with those for the plaintext title and body."""
+        self.terms = [PostTerm(token=token, weight=weight)
+                      for token, weight in blind_index.weights(title, body).items()]
+
+
+class PostTerm(db.Model):
+    __tablename__ = 'post_terms'
+
+    # Search index: one row per distinct term of a post, keyed by the term's blind index token. The primary key
+    # leads with the token, so a search reads only the rows of the terms searched for.
+    token = db.Column(db.LargeBinary(16), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True, index=True)
+    weight = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def search(tokens, limit, max_postings, session=None):
+        """Ids of the posts matching most of the tokens, best first, then by weight and newest.
+
+        Each token contributes only its newest max_postings posts, so the work is bounded by the query rather
+        than by the number of posts.
+        """
+        if not tokens:
+            return []
+        postings = db.union_all(*[
+            select(PostTerm.post_id, PostTerm.weight).where(PostTerm.token == token)
+            .order_by(PostTerm.post_id.desc()).limit(max_postings).subquery().select()
+            for token in tokens]).subquery()
+        matched = db.func.count().label('matched')
+        score = db.func.sum(postings.c.weight).label('score')
+        return (session or db.session).scalars(select(postings.c.post_id).group_by(postings.c.post_id)
+                                               .order_by(db.desc(matched), db.desc(score), db.desc(postings.c.post_id))
+                                               .limit(limit)).all()
+
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
@@ -111,7 +250,7 @@ class User(db.Model, UserMixin):
     active = db.Column(db.Boolean(), default=True, nullable=False)
 
     # User role. Possible values: 'end_user', 'sec_admin', 'db_admin'
-    role = db.Column(db.String(20), default='end_user', nullable=False)
+    role = db.Column(db.String(20), default='end_user', nullable=False, index=True)
 
     # Other
     salt = db.Column(db.String(100), nullable=False)
@@ -124,6 +263,11 @@ class User(db.Model, UserMixin):
     # Relationships
     posts = db.relationship("Post", order_by=Post.id, back_populates="user")
     log = db.relationship("Log", uselist=False, back_populates="user")
+    rotation = db.relationship("KeyRotation", uselist=False, back_populates="user")
+
+    # Number of posts, counted through the posts.userid index. Deferred, so only queries that ask for it pay for it.
+    post_count = db.column_property(select(db.func.count(Post.id)).where(Post.userid == id).correlate_except(Post)
+                                    .scalar_subquery(), deferred=True)
 
     def __init__(self, email, firstname, lastname, phone, password):
         self.email = email
@@ -140,7 +284,27 @@ class User(db.Model, UserMixin):
         db.session.commit()
 
     def verify_password(self, _submitted):
-        return ph.verify(self.password, _submitted)
+        if not passwords.verify(self.password, _submitted):
+            return False
+        if passwords.needs_rehash(self.password) and self.change_password(passwords.hash(_submitted)):
+            db.session.commit()
+        if self.rotation is not None:
+            schedule_rotation(self.id)
+        return True
+
+    def change_password(self, password_hash):
+        """Switch to a new password hash and salt, and so a new post key. The caller commits.
+
+        Existing posts stay readable through the old key until KeyRotation.run has moved them over. Returns
+        False, changing nothing, while a previous rotation is still pending.
+        """
+        if self.rotation is not None:
+            return False
+        if db.session.query(Post.id).filter_by(userid=self.id).first():
+            self.rotation = KeyRotation(self.id, self.password, self.salt)
+        self.password = password_hash
+        self.salt = base64.b64encode(secrets.token_bytes(32)).decode()
+        return True
 
     def verify_pin(self, _submitted):
         return pyotp.TOTP(self.mfa_key).verify(_submitted)
@@ -149,41 +313,172 @@ class User(db.Model, UserMixin):
     def uri(self):
         return str(pyotp.totp.TOTP(self.mfa_key).provisioning_uri(self.email, "2031 Blog"))
 
+    @staticmethod
+    def derive_key(user_id, password, salt):
+        # Cached on (id, password hash, salt) so a changed password never reuses a stale key.
+        cache_key = (user_id, password, salt)
+        key = key_cache.get(cache_key)
+        if key is None:
+            metrics.count('kdf')
+            key = base64.b64encode(scrypt(password=password.encode(), salt=salt.encode(), n=2048, r=8, p=1, dklen=32))
+            key_cache.put(cache_key, key, len(key) + len(password) + len(salt))
+        return key
+
     @property
     def key(self):
-        return base64.b64encode(scrypt(password=self.password.encode(), salt=self.salt.encode(),
-                                       n=2048, r=8, p=1, dklen=32))
+        return User.derive_key(self.id, self.password, self.salt)
 
     @property
     def fernet(self):
+        # Encrypts with the current key; during a rotation it also decrypts posts still under the old one.
+        if self.rotation is not None:
+            return MultiFernet([Fernet(self.key), Fernet(self.rotation.old_key)])
         return Fernet(self.key)
 
     def encrypt(self, data):
         return self.fernet.encrypt(data.encode())
 
     def decrypt(self, data):
+        metrics.count('decrypt')
         return self.fernet.decrypt(data).decode()
 
     @property
     def is_active(self):
         return self.active
 
+    @property
+    def identity(self):
+        return Identity(self.id, self.email, self.role, self.active, self.firstname, self.lastname)
+
     @login_manager.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        identity = identity_cache.get(int(id))
+        if identity is None:
+            user = db.session.get(User, int(id))
+            if user is None:
+                return None
+            identity = user.identity
+            identity_cache.put(user.id, identity)
+        return CurrentUser(identity)
+
+
+Identity = namedtuple('Identity', ['id', 'email', 'role', 'active', 'firstname', 'lastname'])
+
+
+class CurrentUser(UserMixin):
+    """Per-request stand-in for the logged-in User, built from a cached Identity.
+
+    Anything beyond the identity fields (keys, posts, log, ...) loads the full User on first use.
+    """
+
+    def __init__(self, identity):
+        self.id, self.email, self.role, self.active, self.firstname, self.lastname = identity
+        self._user = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return getattr(self._user, name)
+
+    @property
+    def is_active(self):
+        return self.active
+
+
+# Snapshots of users changed or deleted in a flush are evicted once the transaction commits. Evicting any
+# earlier would let a concurrent request cache the still committed old row again, e.g. a revoked role or
+# deactivation, for up to IDENTITY_CACHE_TTL.
+def note_identity_changes(session, flush_context):
+    changed = session.info.setdefault('identity_changes', set())
+    changed.update(user.id for user in session.dirty if isinstance(user, User)
+                   and any(db.inspect(user).attrs[field].history.has_changes() for field in Identity._fields))
+    changed.update(user.id for user in session.deleted if isinstance(user, User))
+
+
+def forget_identities(session):
+    for user_id in session.info.pop('identity_changes', ()):
+        identity_cache.discard(user_id)
+
+
+def drop_identity_changes(session):
+    session.info.pop('identity_changes', None)
+
+
+db.event.listen(Session, 'after_flush', note_identity_changes)
+db.event.listen(Session, 'after_commit', forget_identities)
+db.event.listen(Session, 'after_rollback', drop_identity_changes)
+
+
+class KeyRotation(db.Model):
+    __tablename__ = "key_rotations"
+
+    # Checkpoint for moving a user's posts to a new key. Posts with id <= last_post_id are under the
+    # new key, later ones may still be under the key derived from old_password and old_salt.
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    user = db.relationship("User", back_populates="rotation")
+
+    old_password = db.Column(db.String(100), nullable=False)
+    old_salt = db.Column(db.String(100), nullable=False)
+    last_post_id = db.Column(db.Integer, nullable=False)
+    started = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, user_id, old_password, old_salt):
+        self.user_id = user_id
+        self.old_password = old_password
+        self.old_salt = old_salt
+        self.last_post_id = 0
+        self.started = datetime.now()
+
+    @property
+    def old_key(self):
+        return User.derive_key(self.user_id, self.old_password, self.old_salt)
+
+    def run(self, batch_size):
+        """Re-encrypt the remaining posts in id order, committing each batch with the checkpoint.
+
+        Only id, title and body are selected, so memory stays at one batch however many posts the user has,
+        and each write transaction holds the lock for a single batch. A post edited since it was read keeps
+        its edit: the update only applies while the stored ciphertext is unchanged.
+        """
+        fernet = self.user.fernet
+        posts = Post.__table__
+        rotate = posts.update() \
+            .where(posts.c.id == bindparam('post_id'), posts.c.title == bindparam('old_title'),
+                   posts.c.body == bindparam('old_body')) \
+            .values(title=bindparam('new_title'), body=bindparam('new_body'))
+        while True:
+            batch = db.session.execute(
+                select(posts.c.id, posts.c.title, posts.c.body)
+                .where(posts.c.userid == self.user_id, posts.c.id > self.last_post_id)
+                .order_by(posts.c.id).limit(batch_size)).all()
+            if not batch:
+                break
+            # rotate() decrypts with whichever key matches and re-encrypts with the new one, keeping the
+            # original timestamp and skipping the plaintext decode/encode round trip.
+            db.session.execute(rotate, [{'post_id': post_id, 'old_title': title, 'old_body': body,
+                                         'new_title': fernet.rotate(title), 'new_body': fernet.rotate(body)}
+                                        for post_id, title, body in batch])
+            self.last_post_id = batch[-1].id
+            db.session.commit()
+        old_cache_key = (self.user_id, self.old_password, self.old_salt)
+        db.session.delete(self)
+        db.session.commit()
+        key_cache.discard(old_cache_key)
 
 
 class Log(db.Model):
     __tablename__ = "logs"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     user = db.relationship("User", back_populates="log")
 
     registration = db.Column(db.DateTime, nullable=False)
-    latest_login = db.Column(db.DateTime)
+    latest_login = db.Column(db.DateTime, index=True)
     previous_login = db.Column(db.DateTime)
-    latest_login_ip = db.Column(db.String)
+    latest_login_ip = db.Column(db.String, index=True)
     previous_login_ip = db.Column(db.String)
 
     def __init__(self, user_id):
@@ -198,65 +493,116 @@ class Log(db.Model):
         db.session.commit()
 
 
-# DATABASE ADMINISTRATOR
-class MainIndexLink(MenuLink):
-    def get_url(self):
-        return url_for('index')
-
-
-class PostView(ModelView):
-    column_display_pk = True
-    column_hide_backrefs = False
-    column_list = ('id', 'userid', 'created', 'title', 'body', 'user')
-
-    can_edit = False
-    can_create = False
-    can_delete = False
-
-    def is_accessible(self):
-        return flask_login.current_user.is_authenticated and flask_login.current_user.role == "db_admin"
-
-    def inaccessible_callback(self, name, **kwargs):
-        if flask_login.current_user.is_authenticated:
-            user = flask_login.current_user
-            logger.info(f"Unauthorised Role Access Attempt. Email: {user.email} Role: {user.role}"
-                        f" Requested URL: /admin/ IP:{flask.request.remote_addr}")
-            return render_template('errors/403.html')
-        else:
-            flash("Login to view this Page.", category='info')
-            return redirect(url_for('accounts.login'))
-
-
-class UserView(ModelView):
-    column_display_pk = True
-    column_hide_backrefs = False
-    column_list = (
-        'id', 'role', 'email', 'password', 'firstname', 'lastname', 'phone', 'posts', 'mfa_enabled', 'mfa_key', 'salt')
-
-    can_edit = False
-    can_create = False
-    can_delete = False
-
-    def is_accessible(self):
-        return flask_login.current_user.is_authenticated and flask_login.current_user.role == "db_admin"
-
-    def inaccessible_callback(self, name, **kwargs):
-        if flask_login.current_user.is_authenticated:
-            user = flask_login.current_user
-            logger.info(f"Unauthorised Role Access Attempt. Email: {user.email} Role: {user.role}"
-                        f" Requested URL: /admin/ IP:{flask.request.remote_addr}")
-            return render_template('errors/403.html')
-        else:
-            flash("Login to view this Page.", category='info')
-            return redirect(url_for('accounts.login'))
-
-
-admin = Admin(app, name='DB Admin', template_mode='bootstrap4')
-admin._menu = admin._menu[1:]
-app.config['FLASK_ADMIN_FLUID_LAYOUT'] = (os.getenv('FLASK_ADMIN_FLUID_LAYOUT') == "True")
-admin.add_link(MainIndexLink(name='Home Page'))
-admin.add_view(PostView(Post, db.session))
-admin.add_view(UserView(User, db.session))
+def upsert(connection, table, values, update):
+    """Insert a row, or apply `update` to the row already holding its primary key, as one statement.
+
+    Concurrent writers of a new key cannot both insert it, as they could with an UPDATE followed by an INSERT.
+    """
+    if connection.dialect.name == 'mysql':
+        statement = mysql.insert(table).values(values).on_duplicate_key_update(update)
+    else:
+        dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(table).values(values).on_conflict_do_update(
+            index_elements=list(table.primary_key.columns), set_=update)
+    connection.execute(statement)
+
+
+class EventCount(db.Model):
+    __tablename__ = "event_counts"
+
+    # Counters for the security dashboard per BUCKET of time, e.g. ('failed_login_ip', '10.0.0.1', 14:05) -> 3.
+    # Possible kinds: 'registration', 'failed_login_ip', 'failed_login_email', 'lockout'
+    KEY_LENGTH = 100
+    BUCKET = timedelta(minutes=5)
+
+    kind = db.Column(db.String(30), primary_key=True)
+    key = db.Column(db.String(KEY_LENGTH), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index('ix_event_counts_kind_bucket', 'kind', 'bucket'),)
+
+    def __init__(self, kind, key, bucket):
+        self.kind = kind
+        self.key = key
+        self.bucket = bucket
+        self.count = 1
+
+    @staticmethod
+    def record(kind, key=''):
+        """Count one event in the current bucket. The caller commits."""
+        bucket = EventCount.bucket_start(datetime.now())
+        table = EventCount.__table__
+        upsert(db.session.connection(), table, {'kind': kind, 'key': EventCount.stored_key(key), 'bucket': bucket,
+                                                'count': 1}, {'count': table.c.count + 1})
+        FeedVersion.bump(db.session.connection(), 'security')
+
+    @staticmethod
+    def stored_key(key):
+        """The key as stored. One longer than the column, e.g. a submitted email, is cut short and ends in a hash
+        of the whole key, so different long keys are still counted apart.
+        """
+        if len(key) <= EventCount.KEY_LENGTH:
+            return key
+        digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        return f'{key[:EventCount.KEY_LENGTH - len(digest) - 1]}~{digest}'
+
+    @staticmethod
+    def bucket_start(moment):
+        return datetime.min + (moment - datetime.min) // EventCount.BUCKET * EventCount.BUCKET
+
+    @staticmethod
+    def totals(kind, window, limit=10, session=None):
+        # Only buckets starting inside the window count, so e.g. the last hour's totals cover between 55 and 60
+        # minutes, never more.
+        since = datetime.now() - window
+        return (session or db.session).query(EventCount.key, db.func.sum(EventCount.count).label('total')) \
+            .filter(EventCount.kind == kind, EventCount.bucket > since) \
+            .group_by(EventCount.key).order_by(db.desc('total')).limit(limit).all()
+
+    @staticmethod
+    def daily(kind, days=7, session=None):
+        since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+        per_day = {}
+        for bucket, count in (session or db.session).query(EventCount.bucket, EventCount.count) \
+                .filter(EventCount.kind == kind, EventCount.bucket >= since):
+            per_day[bucket.date()] = per_day.get(bucket.date(), 0) + count
+        return sorted(per_day.items(), reverse=True)
+
+
+class FeedVersion(db.Model):
+    __tablename__ = "feed_versions"
+
+    # Change counter per page feed, bumped in the same transaction as every change the feed shows, so
+    # conditional requests can be answered from one primary key lookup. Possible feeds: 'posts', 'security'
+    feed = db.Column(db.String(30), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    modified = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def current(feed):
+        row = db.session.execute(select(FeedVersion.version, FeedVersion.modified)
+                                 .where(FeedVersion.feed == feed)).first()
+        return (row.version, row.modified) if row else (0, None)
+
+    @staticmethod
+    def bump(connection, feed):
+        table = FeedVersion.__table__
+        now = datetime.now()
+        upsert(connection, table, {'feed': feed, 'version': 1, 'modified': now},
+               {'version': table.c.version + 1, 'modified': now})
+
+
+def bump_feed(feed):
+    def listener(mapper, connection, target):
+        FeedVersion.bump(connection, feed)
+    return listener
+
+
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+    db.event.listen(Post, event_name, bump_feed('posts'))
+    db.event.listen(User, event_name, bump_feed('security'))
+    db.event.listen(Log, event_name, bump_feed('security'))
 
 
 # CUSTOM DECORATORS
@@ -277,52 +623,300 @@ def roles_required(url, *roles):
         def wrapped(*args, **kwargs):
             if flask_login.current_user.role not in roles:
                 user = flask_login.current_user
-                logger.info(f"Unauthorised Role Access Attempt. Email: {user.email} Role: {user.role}"
-                            f" Requested URL: {url} IP:{flask.request.remote_addr}")
-                return render_template('errors/403.html')
-            return f(*args, **kwargs)
+                logger.info("Unauthorised Role Access Attempt", extra={'email': user.email, 'role': user.role,
+                                                                       'url': url, 'ip': flask.request.remote_addr})
+                flask.abort(403)
+            return current_app.ensure_sync(f)(*args, **kwargs)
 
         return wrapped
 
     return inner_decorator
 
 
-# RATE LIMITING
-limiter = Limiter(key_func=get_remote_address, app=app, default_limits=["500/day"])
+def conditional(validator, shows_flashes=True):
+    """Answer a matching If-None-Match with 304 before the view runs.
+
+    validator() returns (parts, last_modified). The ETag hashes the parts with the viewer's id and role and the
+    query string, because pages show per-viewer controls, and only the ETag decides a 304: Last-Modified is
+    sent, but If-Modified-Since alone could match a page cached for another user. On pages that show flash
+    messages, requests with messages pending always get the full page.
+    """
+    def inner_decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if shows_flashes and '_flashes' in flask.session:
+                return current_app.ensure_sync(f)(*args, **kwargs)
+            parts, last_modified = validator()
+            user = flask_login.current_user
+            etag = hashlib.blake2b(repr((parts, user.id, user.role, flask.request.query_string)).encode(),
+                                   digest_size=16).hexdigest()
+            if is_resource_modified(flask.request.environ, etag=etag):
+                response = flask.make_response(current_app.ensure_sync(f)(*args, **kwargs))
+            else:
+                response = flask.Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
 
-# IMPORT BLUEPRINTS
-from accounts.views import accounts_bp
-from posts.views import posts_bp
-from security.views import security_bp
+        return wrapped
 
-# SECRET KEY FOR FLASK FORMS
-if os.getenv('SECRET_KEY'):
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-else:
-    secret_key = secrets.token_hex(16)
-    app.config['SECRET_KEY'] = secret_key
-    set_key(".env", key_to_set='SECRET_KEY', value_to_set=secret_key)
+    return inner_decorator
 
-# REGISTER BLUEPRINTS
-app.register_blueprint(accounts_bp)
-app.register_blueprint(posts_bp)
-app.register_blueprint(security_bp)
 
-# SETUP TALISMAN
-csp = {
-    'xyz-src': ['\'self\''],
-    'style-src': ["https://cdn.jsdelivr.net/npm/bootstrap@4.6.2/dist/css/bootstrap.min.css",
-                  "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/swatch/default/bootstrap.min.css?v=4.2.1",
-                "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/css/bootstrap.min.css?v=4.2.1",
-                  "http://127.0.0.1:5000/admin/static/admin/css/bootstrap4/admin.css?v=1.1.1",
-                  "http://127.0.0.1:5000/admin/static/bootstrap/bootstrap4/css/font-awesome.min.css?v=4.7.0",
-                  "http://127.0.0.1:5000/admin/static/vendor/select2/select2.css?v=4.2.1",
-                  "http://127.0.0.1:5000/admin/static/vendor/select2/select2-bootstrap4.css?v=1.4.6",
-                  "http://127.0.0.1:5000/admin/static/vendor/bootstrap-daterangepicker/daterangepicker-bs4.css?v=1.3.22"],
-    'script-src': ["https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/js/bootstrap.bundle.min.js",
-                   "https://www.google.com/recaptcha/",
-                   "https://www.gstatic.com/recaptcha/"],
-    'frame-src': ["https://www.google.com/recaptcha/",
-                  "https://www.gstatic.com/recaptcha/"]
-}
-talisman = Talisman(app, content_security_policy=csp)
+# APP FACTORY
+def create_app(config=None):
+    """Build the app from environment variables (and .env), with `config` overriding any of them."""
+    load_dotenv()
+    app = Flask(__name__)
+
+    # CAPTCHA KEYS
+    app.config['RECAPTCHA_PUBLIC_KEY'] = os.getenv('RECAPTCHA_PUBLIC_KEY')
+    app.config['RECAPTCHA_PRIVATE_KEY'] = os.getenv('RECAPTCHA_PRIVATE_KEY')
+
+    # DATABASE CONFIGURATION
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
+    app.config['SQLALCHEMY_ECHO'] = (os.getenv('SQLALCHEMY_ECHO') == "True")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = (os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS') == "True")
+
+    # ENGINE PROFILE
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': (os.getenv('SQLALCHEMY_POOL_PRE_PING', "True") == "True"),
+        'pool_recycle': int(os.getenv('SQLALCHEMY_POOL_RECYCLE', 1800)),
+    }
+    if os.getenv('SQLALCHEMY_POOL_SIZE'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] = int(os.getenv('SQLALCHEMY_POOL_SIZE'))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['max_overflow'] = int(os.getenv('SQLALCHEMY_MAX_OVERFLOW', 10))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # ASYNC VIEWS
+    # Switched on by asgi.create_asgi_app(): /posts, /security and /account then read the database through an
+    # async engine, by default the async driver of SQLALCHEMY_DATABASE_URI.
+    app.config['ASYNC_VIEWS'] = False
+    app.config['SQLALCHEMY_ASYNC_DATABASE_URI'] = os.getenv('SQLALCHEMY_ASYNC_DATABASE_URI')
+
+    # OPTIONAL EXTENSIONS
+    # Flask-Admin and the QR code extension are only imported and set up where they are enabled.
+    app.config['ADMIN_ENABLED'] = (os.getenv('ADMIN_ENABLED', "True") == "True")
+    app.config['FLASK_ADMIN_FLUID_LAYOUT'] = (os.getenv('FLASK_ADMIN_FLUID_LAYOUT') == "True")
+    app.config['QRCODE_ENABLED'] = (os.getenv('QRCODE_ENABLED', "True") == "True")
+
+    # DB ADMIN
+    # List pages count at most ADMIN_COUNT_LIMIT rows, past that the count of a whole table is estimated.
+    app.config['ADMIN_PAGE_SIZE'] = int(os.getenv('ADMIN_PAGE_SIZE', 20))
+    app.config['ADMIN_COUNT_LIMIT'] = int(os.getenv('ADMIN_COUNT_LIMIT', 10000))
+    # CSV exports stream rows from the database in batches of ADMIN_EXPORT_BATCH_SIZE, 0 rows means no limit.
+    app.config['ADMIN_EXPORT_BATCH_SIZE'] = int(os.getenv('ADMIN_EXPORT_BATCH_SIZE', 1000))
+    app.config['ADMIN_EXPORT_MAX_ROWS'] = int(os.getenv('ADMIN_EXPORT_MAX_ROWS', 0))
+
+    # SECURITY LOG
+    app.config['SECURITY_LOG_FILE'] = os.getenv('SECURITY_LOG_FILE', 'security.log')
+    app.config['SECURITY_LOG_QUEUE_SIZE'] = int(os.getenv('SECURITY_LOG_QUEUE_SIZE', 10000))
+    app.config['SECURITY_LOG_BATCH_SIZE'] = int(os.getenv('SECURITY_LOG_BATCH_SIZE', 100))
+    app.config['SECURITY_LOG_FLUSH_INTERVAL'] = float(os.getenv('SECURITY_LOG_FLUSH_INTERVAL', 1.0))
+    app.config['SECURITY_LOG_INDEX'] = os.getenv('SECURITY_LOG_INDEX')  # defaults to SECURITY_LOG_FILE + '.idx'
+    app.config['SECURITY_LOG_PAGE_SIZE'] = int(os.getenv('SECURITY_LOG_PAGE_SIZE', 25))
+    app.config['SECURITY_USERS_PER_PAGE'] = int(os.getenv('SECURITY_USERS_PER_PAGE', 50))
+    app.config['SECURITY_USERS_BATCH_SIZE'] = int(os.getenv('SECURITY_USERS_BATCH_SIZE', 100))
+
+    # METRICS
+    app.config['METRICS_ENABLED'] = (os.getenv('METRICS_ENABLED', "True") == "True")
+    app.config['METRICS_SERVER_TIMING'] = (os.getenv('METRICS_SERVER_TIMING') == "True")
+
+    # FIREWALL
+    # With FIREWALL_INSPECT_BODY, url-encoded form bodies are checked too and ones over FIREWALL_MAX_BODY refused.
+    app.config['FIREWALL_RULES'] = os.getenv('FIREWALL_RULES', os.path.join(app.root_path, 'firewall_rules.json'))
+    app.config['FIREWALL_INSPECT_BODY'] = (os.getenv('FIREWALL_INSPECT_BODY') == "True")
+    app.config['FIREWALL_MAX_BODY'] = int(os.getenv('FIREWALL_MAX_BODY', 64 * 1024))
+
+    # POSTS FEED
+    app.config['POSTS_PER_PAGE'] = int(os.getenv('POSTS_PER_PAGE', 20))
+    app.config['POSTS_MAX_PER_PAGE'] = int(os.getenv('POSTS_MAX_PER_PAGE', 100))
+    app.config['POST_DECRYPT_MODE'] = os.getenv('POST_DECRYPT_MODE', 'serial')  # 'serial' or 'parallel'
+    app.config['POST_DECRYPT_WORKERS'] = int(os.getenv('POST_DECRYPT_WORKERS', os.cpu_count() or 1))
+    # Posts are read from the database, decrypted and sent in batches of POSTS_BATCH_SIZE while the page streams.
+    app.config['POSTS_BATCH_SIZE'] = int(os.getenv('POSTS_BATCH_SIZE', 20))
+
+    # POSTS API
+    # POST /api/posts writes up to POSTS_API_MAX_BATCH posts in one transaction from a body of at most
+    # POSTS_API_MAX_BYTES, POSTS_API_RATE_LIMIT times per user.
+    app.config['POSTS_API_MAX_BATCH'] = int(os.getenv('POSTS_API_MAX_BATCH', 100))
+    app.config['POSTS_API_MAX_BYTES'] = int(os.getenv('POSTS_API_MAX_BYTES', 1024 * 1024))
+    app.config['POSTS_API_RATE_LIMIT'] = os.getenv('POSTS_API_RATE_LIMIT', '10/minute')
+
+    # STREAMED PAGES
+    app.config['STREAM_BUFFER_SIZE'] = int(os.getenv('STREAM_BUFFER_SIZE', 16 * 1024))
+
+    # COMPRESSION
+    # Encodings in order of preference, br and zstd are used where the brotli and zstandard packages are installed.
+    app.config['COMPRESSION_ENABLED'] = (os.getenv('COMPRESSION_ENABLED', "True") == "True")
+    app.config['COMPRESSION_ENCODINGS'] = os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip').split(',')
+    app.config['COMPRESSION_LEVELS'] = {'br': int(os.getenv('COMPRESSION_BROTLI_LEVEL', 4)),
+                                        'zstd': int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3)),
+                                        'gzip': int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))}
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 500))
+    app.config['COMPRESSION_MIMETYPES'] = os.getenv(
+        'COMPRESSION_MIMETYPES', 'text/html,text/css,text/plain,text/csv,text/javascript,application/javascript,'
+                                 'application/json,application/xml,image/svg+xml,application/vnd.ms-fontobject,'
+                                 'font/ttf,font/otf').split(',')
+    # Pre-compressed static files, written by `flask static compress`.
+    app.config['COMPRESSION_STATIC_DIR'] = os.getenv('COMPRESSION_STATIC_DIR', 'static_compressed')
+    # Static URLs carry a ?v= version, so browsers may keep them for a year.
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.getenv('SEND_FILE_MAX_AGE_DEFAULT', 365 * 24 * 3600))
+
+    # HASHING
+    app.config['AUTH_MAX_WORKERS'] = int(os.getenv('AUTH_MAX_WORKERS', 2))
+    app.config['AUTH_QUEUE_TIMEOUT'] = float(os.getenv('AUTH_QUEUE_TIMEOUT', 5.0))
+
+    # LOGIN THROTTLE
+    app.config['LOGIN_THROTTLE_IP_LIMIT'] = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', 20))
+    app.config['LOGIN_THROTTLE_EMAIL_LIMIT'] = int(os.getenv('LOGIN_THROTTLE_EMAIL_LIMIT', 5))
+    app.config['LOGIN_THROTTLE_WINDOW'] = int(os.getenv('LOGIN_THROTTLE_WINDOW', 900))
+    app.config['LOGIN_THROTTLE_MAX_DELAY'] = int(os.getenv('LOGIN_THROTTLE_MAX_DELAY', 3600))
+    app.config['LOGIN_THROTTLE_MAX_KEYS'] = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', 100000))
+    app.config['LOGIN_THROTTLE_STATE'] = os.getenv('LOGIN_THROTTLE_STATE', 'login_throttle.db')
+
+    # CACHES
+    app.config['KEY_CACHE_ENABLED'] = (os.getenv('KEY_CACHE_ENABLED', "True") == "True")
+    app.config['KEY_CACHE_SIZE'] = int(os.getenv('KEY_CACHE_SIZE', 1024))
+    app.config['KEY_CACHE_MAX_BYTES'] = int(os.getenv('KEY_CACHE_MAX_BYTES', 256 * 1024))
+    app.config['KEY_CACHE_TTL'] = int(os.getenv('KEY_CACHE_TTL', 600))
+    app.config['CARD_CACHE_ENABLED'] = (os.getenv('CARD_CACHE_ENABLED', "True") == "True")
+    app.config['CARD_CACHE_SIZE'] = int(os.getenv('CARD_CACHE_SIZE', 4096))
+    app.config['CARD_CACHE_MAX_BYTES'] = int(os.getenv('CARD_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    app.config['CARD_CACHE_TTL'] = int(os.getenv('CARD_CACHE_TTL', 3600))
+    app.config['IDENTITY_CACHE_ENABLED'] = (os.getenv('IDENTITY_CACHE_ENABLED', "True") == "True")
+    app.config['IDENTITY_CACHE_SIZE'] = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+    app.config['IDENTITY_CACHE_MAX_BYTES'] = int(os.getenv('IDENTITY_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.getenv('IDENTITY_CACHE_TTL', 30))
+
+    # POST SEARCH
+    # Key of the blind index, defaults to one derived from SECRET_KEY. After changing either, rebuild the index
+    # with `flask data reindex --rebuild`.
+    app.config['BLIND_INDEX_KEY'] = os.getenv('BLIND_INDEX_KEY')
+    app.config['SEARCH_RESULTS'] = int(os.getenv('SEARCH_RESULTS', 50))
+    app.config['SEARCH_MAX_TERMS'] = int(os.getenv('SEARCH_MAX_TERMS', 8))
+    app.config['SEARCH_MAX_POSTINGS'] = int(os.getenv('SEARCH_MAX_POSTINGS', 1000))
+    app.config['REINDEX_BATCH_SIZE'] = int(os.getenv('REINDEX_BATCH_SIZE', 500))
+
+    # POST RE-ENCRYPTION
+    app.config['REKEY_BATCH_SIZE'] = int(os.getenv('REKEY_BATCH_SIZE', 200))
+    app.config['REKEY_WORKERS'] = int(os.getenv('REKEY_WORKERS', 1))
+
+    # RATE LIMITING
+    # memory:// keeps separate counters per worker process, use sqlite:///<file> to share them on one host.
+    app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+
+    # SECRET KEY FOR FLASK FORMS
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+
+    app.config.from_mapping(config or {})
+
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError("SECRET_KEY is not set. Add one to .env, e.g. the output of "
+                           "`python -c \"import secrets; print(secrets.token_hex(32))\"`.")
+    if not app.config['BLIND_INDEX_KEY']:
+        app.config['BLIND_INDEX_KEY'] = hmac.new(app.config['SECRET_KEY'].encode(), b'blind index',
+                                                 hashlib.sha256).hexdigest()
+    if not app.config['SECURITY_LOG_INDEX']:
+        app.config['SECURITY_LOG_INDEX'] = app.config['SECURITY_LOG_FILE'] + '.idx'
+
+    # INIT EXTENSIONS
+    db.init_app(app)
+    migrate.init_app(app, db)
+    with app.app_context():
+        engines = [db.engine]
+        if app.config['ASYNC_VIEWS']:
+            app.extensions['async_db'] = AsyncDatabase()
+            app.extensions['async_db'].init_app(app, app.config['SQLALCHEMY_ASYNC_DATABASE_URI']
+                                                or async_url(db.engine.url))
+            engines.append(app.extensions['async_db'].engine.sync_engine)
+        for engine in engines:
+            if engine.dialect.name == 'sqlite':
+                db.event.listen(engine, 'connect',
+                                partial(set_sqlite_pragmas, mmap_size=app.config['SQLITE_MMAP_SIZE']))
+    login_manager.init_app(app)
+    limiter.init_app(app)
+    app.extensions['metrics'] = Metrics()
+    app.extensions['metrics'].init_app(app)
+
+    # INIT LOGGER
+    logging.basicConfig(level=logging.INFO)
+    security_logger = logging.Logger("Security Log")
+    handler = BatchingFileHandler(app.config['SECURITY_LOG_FILE'], queue_size=app.config['SECURITY_LOG_QUEUE_SIZE'],
+                                  batch_size=app.config['SECURITY_LOG_BATCH_SIZE'],
+                                  flush_interval=app.config['SECURITY_LOG_FLUSH_INTERVAL'])
+    handler.setLevel(0)
+    handler.setFormatter(JsonFormatter())
+    security_logger.addHandler(handler)
+    app.extensions['security_logger'] = security_logger
+    app.extensions['security_log'] = handler
+
+    # INIT SERVICES
+    app.extensions['passwords'] = PasswordService(ph, max_workers=app.config['AUTH_MAX_WORKERS'],
+                                                  queue_timeout=app.config['AUTH_QUEUE_TIMEOUT'])
+    throttle = LoginThrottle(limits={'ip': app.config['LOGIN_THROTTLE_IP_LIMIT'],
+                                     'email': app.config['LOGIN_THROTTLE_EMAIL_LIMIT']},
+                             window=app.config['LOGIN_THROTTLE_WINDOW'],
+                             max_delay=app.config['LOGIN_THROTTLE_MAX_DELAY'],
+                             max_keys=app.config['LOGIN_THROTTLE_MAX_KEYS'],
+                             persist_path=app.config['LOGIN_THROTTLE_STATE'])
+    atexit.register(throttle.persist)
+    app.extensions['login_throttle'] = throttle
+    for name, prefix in (('key_cache', 'KEY_CACHE'), ('card_cache', 'CARD_CACHE'),
+                         ('identity_cache', 'IDENTITY_CACHE')):
+        app.extensions[name] = LRUCache(max_entries=app.config[f'{prefix}_SIZE'],
+                                        max_bytes=app.config[f'{prefix}_MAX_BYTES'],
+                                        ttl=app.config[f'{prefix}_TTL'], enabled=app.config[f'{prefix}_ENABLED'])
+    # Cached keys and cards hold plaintext secrets, drop them on shutdown.
+    atexit.register(app.extensions['key_cache'].clear)
+    atexit.register(app.extensions['card_cache'].clear)
+    app.extensions['blind_index'] = BlindIndex(key=app.config['BLIND_INDEX_KEY'].encode())
+    app.extensions['rekey_running'] = set()
+
+    # INIT OPTIONAL EXTENSIONS
+    if app.config['QRCODE_ENABLED']:
+        from flask_qrcode import QRcode
+        QRcode(app)
+    if app.config['ADMIN_ENABLED']:
+        from admin_views import init_admin
+        init_admin(app)
+
+    # REGISTER BLUEPRINTS
+    from accounts.views import accounts_bp
+    from posts.views import posts_bp
+    from posts.api import posts_api_bp
+    from security.views import security_bp
+    from home import views as home_views
+
+    app.register_blueprint(accounts_bp)
+    app.register_blueprint(posts_bp)
+    app.register_blueprint(posts_api_bp)
+    app.register_blueprint(security_bp)
+    home_views.init_app(app)
+
+    # ASYNC VIEWS
+    if app.config['ASYNC_VIEWS']:
+        from accounts.views import account_async
+        from posts.views import posts_async
+        from security.views import security_async
+
+        app.view_functions.update({'posts.posts': posts_async, 'security.security': security_async,
+                                   'accounts.account': account_async})
+
+    # REGISTER CLI COMMANDS
+    from commands import data_cli, static_cli
+
+    app.cli.add_command(data_cli)
+    app.cli.add_command(static_cli)
+
+    # SETUP TALISMAN
+    Talisman(app, content_security_policy=csp)
+
+    # SETUP COMPRESSION
+    # Registered last so it runs first of the app's after_request functions and the rest see the final response.
+    app.extensions['compression'] = Compression()
+    app.extensions['compression'].init_app(app)
+
+    return app
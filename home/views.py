@@ -0,0 +1,62 @@
+import flask
+from flask import render_template, current_app
+from security.firewall import Firewall
+
+
+def init_app(app):
+    app.extensions['firewall'] = Firewall.from_file(app.config['FIREWALL_RULES'])
+    app.add_url_rule('/', 'index', index)
+    app.before_request(firewall)
+    app.register_error_handler(400, http400)
+    app.register_error_handler(403, http403)
+    app.register_error_handler(404, http404)
+    app.register_error_handler(429, http429)
+    app.register_error_handler(500, http500)
+    app.register_error_handler(501, http501)
+    app.register_error_handler(503, http503)
+
+
+def index():
+    return render_template('home/index.html')
+
+
+def firewall():
+    request = flask.request
+    config = current_app.config
+    inputs = [request.path, request.query_string.decode()]
+    if config['FIREWALL_INSPECT_BODY'] and request.mimetype == 'application/x-www-form-urlencoded':
+        # A body longer than FIREWALL_MAX_BODY is refused with 413 while it is read, not passed on unchecked,
+        # so padding a payload cannot carry it past the rules.
+        request.max_content_length = config['FIREWALL_MAX_BODY']
+        inputs.append(request.get_data(cache=True, as_text=True))
+    attack_type = current_app.extensions['firewall'].check(*inputs)
+    if attack_type:
+        return render_template('errors/attack.html', attack_type=attack_type)
+
+
+def http400(e):
+    return render_template('errors/400.html')
+
+
+def http403(e):
+    return render_template('errors/403.html'), 403
+
+
+def http404(e):
+    return render_template('errors/404.html')
+
+
+def http429(e):
+    return render_template('errors/429.html')
+
+
+def http500(e):
+    return render_template('errors/500.html')
+
+
+def http501(e):
+    return render_template('errors/501.html')
+
+
+def http503(e):
+    return render_template('errors/503.html'), 503
@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """Flask-Limiter storage shared by every worker process on a host, backed by one SQLite file.
+
+    Use with RATELIMIT_STORAGE_URI=sqlite:///ratelimit.db (relative) or sqlite:////var/run/blog/ratelimit.db.
+    Increments run in a single write transaction, so counts stay exact under `gunicorn -w N`.
+    Expired counters are swept at most once per `sweep_interval` seconds per process.
+    Supports the default fixed-window strategy.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, sweep_interval=60, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri.split(':///', 1)[1] or ':memory:'
+        self.sweep_interval = float(sweep_interval)
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        self._connection().execute("CREATE TABLE IF NOT EXISTS rate_limits "
+                                   "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_expires ON rate_limits (expires)")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO rate_limits (key, count, expires) VALUES (?, ?, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET "
+                         "count = CASE WHEN expires <= ? THEN excluded.count ELSE count + excluded.count END, "
+                         "expires = CASE WHEN expires <= ? THEN excluded.expires ELSE expires END",
+                         (key, amount, now + expiry, now, now))
+            count = conn.execute("SELECT count FROM rate_limits WHERE key = ?", (key,)).fetchone()[0]
+            if now >= self._next_sweep:
+                conn.execute("DELETE FROM rate_limits WHERE expires <= ?", (now,))
+                self._next_sweep = now + self.sweep_interval
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def get(self, key):
+        row = self._connection().execute("SELECT count FROM rate_limits WHERE key = ? AND expires > ?",
+                                         (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute("SELECT expires FROM rate_limits WHERE key = ? AND expires > ?",
+                                         (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+
+import flask
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style, not thread-safe on its own."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestStats:
+    __slots__ = ('start', 'queries', 'query_time', 'template_time', 'template_depth', 'template_start', 'counts')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.template_start = 0.0
+        self.counts = {}
+
+
+class Metrics:
+    """Per-endpoint request instrumentation, aggregated in process and exposed as Prometheus text.
+
+    For every request this records wall time, SQL query count and time (engine cursor events), template
+    render time and named event counts such as key derivations and decryptions (count()). With server_timing
+    on, the same numbers are sent back in a Server-Timing header.
+    """
+
+    HISTOGRAMS = {
+        'blog_request_seconds': ('Request wall time', SECONDS_BUCKETS),
+        'blog_db_queries': ('SQL queries per request', COUNT_BUCKETS),
+        'blog_db_seconds': ('Time spent in SQL per request', SECONDS_BUCKETS),
+        'blog_template_seconds': ('Template render time per request', SECONDS_BUCKETS),
+    }
+
+    def __init__(self, enabled=True, server_timing=False):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', self.enabled)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', self.server_timing)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        # Engine events are global, listen once however many apps are created. The listeners only touch the
+        # current request's stats, so they serve every app's instance.
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _stats():
+        if flask.has_request_context():
+            return flask.g.get('_request_stats')
+        return None
+
+    def count(self, name, amount=1):
+        """Add to a named per-request count, e.g. metrics.count('kdf'). Outside a request this is a no-op."""
+        stats = self._stats()
+        if stats is not None:
+            stats.counts[name] = stats.counts.get(name, 0) + amount
+
+    def _before_request(self):
+        if self.enabled:
+            flask.g._request_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = self._stats()
+        if stats is None:
+            return response
+        endpoint = flask.request.endpoint or 'unmatched'
+        if self.server_timing:
+            # For a streamed response these are the numbers up to the headers, i.e. time to first byte.
+            timings = [f'app;dur={(time.perf_counter() - stats.start) * 1000:.2f}',
+                       f'db;dur={stats.query_time * 1000:.2f};desc="{stats.queries} queries"',
+                       f'tpl;dur={stats.template_time * 1000:.2f}']
+            timings += [f'{name};desc="{amount}"' for name, amount in stats.counts.items()]
+            response.headers.add('Server-Timing', ', '.join(timings))
+        if response.is_streamed:
+            # The body is rendered while it is sent, so record the request once it has been.
+            response.call_on_close(lambda: self._record(stats, endpoint, response.status_code))
+        else:
+            self._record(stats, endpoint, response.status_code)
+        return response
+
+    def _record(self, stats, endpoint, status_code):
+        elapsed = time.perf_counter() - stats.start
+        with self._lock:
+            for name, value in (('blog_request_seconds', elapsed), ('blog_db_queries', stats.queries),
+                                ('blog_db_seconds', stats.query_time),
+                                ('blog_template_seconds', stats.template_time)):
+                key = (name, endpoint)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(self.HISTOGRAMS[name][1])
+                self._histograms[key].observe(value)
+            for name, amount in stats.counts.items():
+                key = (name, endpoint)
+                self._counters[key] = self._counters.get(key, 0) + amount
+            key = ('requests', endpoint, status_code)
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is not None:
+            # Templates rendered while another is rendering are counted once, as part of the outer one.
+            if stats.template_depth == 0:
+                stats.template_start = time.perf_counter()
+            stats.template_depth += 1
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is not None and stats.template_depth:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - stats.template_start
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if Metrics._stats() is not None:
+            conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = Metrics._stats()
+        starts = conn.info.get('_query_start')
+        if stats is not None and starts:
+            stats.queries += 1
+            stats.query_time += time.perf_counter() - starts.pop()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items(), key=lambda item: tuple(map(str, item[0])))
+        lines = []
+        for name, (help_text, buckets) in self.HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (histogram_name, endpoint), histogram in histograms:
+                if histogram_name == name:
+                    lines += histogram.lines(name, f'endpoint="{endpoint}"')
+        lines += ['# HELP blog_requests_total Requests by endpoint and status', '# TYPE blog_requests_total counter']
+        lines += [f'blog_requests_total{{endpoint="{key[1]}",status="{key[2]}"}} {value}'
+                  for key, value in counters if key[0] == 'requests']
+        lines += ['# HELP blog_events_total Counted events (key derivations, decryptions, ...) by endpoint',
+                  '# TYPE blog_events_total counter']
+        lines += [f'blog_events_total{{event="{key[0]}",endpoint="{key[1]}"}} {value}'
+                  for key, value in counters if key[0] != 'requests']
+        return '\n'.join(lines) + '\n'
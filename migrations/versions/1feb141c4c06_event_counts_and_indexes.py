@@ -0,0 +1,59 @@
+"""event counts and indexes
+
+Revision ID: 1feb141c4c06
+Revises: 9b55faa24f0d
+Create Date: 2026-10-18 10:24:41.102937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1feb141c4c06'
+down_revision = '9b55faa24f0d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('event_counts',
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'key', 'bucket', name=op.f('pk_event_counts'))
+    )
+    with op.batch_alter_table('event_counts', schema=None) as batch_op:
+        batch_op.create_index('ix_event_counts_kind_bucket', ['kind', 'bucket'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_role'), ['role'], unique=False)
+
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_logs_latest_login'), ['latest_login'], unique=False)
+        batch_op.create_index(batch_op.f('ix_logs_latest_login_ip'), ['latest_login_ip'], unique=False)
+        batch_op.create_index(batch_op.f('ix_logs_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_posts_created'), ['created'], unique=False)
+        batch_op.create_index(batch_op.f('ix_posts_userid'), ['userid'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_posts_userid'))
+        batch_op.drop_index(batch_op.f('ix_posts_created'))
+
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_logs_user_id'))
+        batch_op.drop_index(batch_op.f('ix_logs_latest_login_ip'))
+        batch_op.drop_index(batch_op.f('ix_logs_latest_login'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_role'))
+
+    with op.batch_alter_table('event_counts', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_counts_kind_bucket')
+
+    op.drop_table('event_counts')
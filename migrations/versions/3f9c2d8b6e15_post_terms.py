@@ -0,0 +1,35 @@
+"""post terms
+
+Revision ID: 3f9c2d8b6e15
+Revises: 8e4a61c0b7d2
+Create Date: 2026-10-18 14:21:53.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2d8b6e15'
+down_revision = '8e4a61c0b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('post_terms',
+    sa.Column('token', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('weight', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], name=op.f('fk_post_terms_post_id_posts')),
+    sa.PrimaryKeyConstraint('token', 'post_id', name=op.f('pk_post_terms'))
+    )
+    with op.batch_alter_table('post_terms', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_post_terms_post_id'), ['post_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post_terms', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_post_terms_post_id'))
+
+    op.drop_table('post_terms')
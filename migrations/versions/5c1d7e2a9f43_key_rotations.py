@@ -0,0 +1,32 @@
+"""key rotations
+
+Revision ID: 5c1d7e2a9f43
+Revises: 1feb141c4c06
+Create Date: 2026-10-18 11:02:37.415208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d7e2a9f43'
+down_revision = '1feb141c4c06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('key_rotations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('old_password', sa.String(length=100), nullable=False),
+    sa.Column('old_salt', sa.String(length=100), nullable=False),
+    sa.Column('last_post_id', sa.Integer(), nullable=False),
+    sa.Column('started', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_key_rotations_user_id_users')),
+    sa.PrimaryKeyConstraint('user_id', name=op.f('pk_key_rotations'))
+    )
+
+
+def downgrade():
+    op.drop_table('key_rotations')
@@ -0,0 +1,33 @@
+"""feed versions
+
+Revision ID: 8e4a61c0b7d2
+Revises: 5c1d7e2a9f43
+Create Date: 2026-10-18 11:48:09.227514
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a61c0b7d2'
+down_revision = '5c1d7e2a9f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    feed_versions = op.create_table('feed_versions',
+    sa.Column('feed', sa.String(length=30), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('modified', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('feed', name=op.f('pk_feed_versions'))
+    )
+    op.bulk_insert(feed_versions, [{'feed': 'posts', 'version': 1, 'modified': datetime.now()},
+                                   {'feed': 'security', 'version': 1, 'modified': datetime.now()}])
+
+
+def downgrade():
+    op.drop_table('feed_versions')
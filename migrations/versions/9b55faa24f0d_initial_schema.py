@@ -0,0 +1,63 @@
+"""initial schema
+
+Databases created earlier with db.create_all() already have these tables:
+run `flask db stamp 9b55faa24f0d` once before `flask db upgrade`.
+
+Revision ID: 9b55faa24f0d
+Revises: 
+Create Date: 2026-10-18 10:19:06.479208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b55faa24f0d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('password', sa.String(length=100), nullable=False),
+    sa.Column('mfa_enabled', sa.Boolean(), nullable=False),
+    sa.Column('mfa_key', sa.String(length=32), nullable=False),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('salt', sa.String(length=100), nullable=False),
+    sa.Column('firstname', sa.String(length=100), nullable=False),
+    sa.Column('lastname', sa.String(length=100), nullable=False),
+    sa.Column('phone', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_users')),
+    sa.UniqueConstraint('email', name=op.f('uq_users_email'))
+    )
+    op.create_table('logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('registration', sa.DateTime(), nullable=False),
+    sa.Column('latest_login', sa.DateTime(), nullable=True),
+    sa.Column('previous_login', sa.DateTime(), nullable=True),
+    sa.Column('latest_login_ip', sa.String(), nullable=True),
+    sa.Column('previous_login_ip', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_logs_user_id_users')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_logs'))
+    )
+    op.create_table('posts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('userid', sa.Integer(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('title', sa.Text(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['userid'], ['users.id'], name=op.f('fk_posts_userid_users')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_posts'))
+    )
+
+
+def downgrade():
+    op.drop_table('posts')
+    op.drop_table('logs')
+    op.drop_table('users')
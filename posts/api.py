@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import flask
+import flask_login
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import login_required
+from sqlalchemy import insert
+
+from config import db, Post, PostTerm, FeedVersion, blind_index, limiter, current_user_key, roles_required, logger
+from posts.forms import PostForm
+
+# JSON counterpart of the post forms, for clients writing many posts at once, e.g. when moving a blog here.
+# It authenticates with the login session like the pages do. Only application/json bodies are accepted, which a
+# browser will not send to another site without CORS, so the forms' CSRF token is not needed.
+posts_api_bp = Blueprint('posts_api', __name__, url_prefix='/api')
+
+
+@posts_api_bp.route('/posts', methods=['POST'])
+@limiter.limit(lambda: current_app.config['POSTS_API_RATE_LIMIT'], key_func=current_user_key)
+@login_required
+@roles_required("/api/posts", "end_user")
+def create_posts():
+    """Create a JSON list of {"title": ..., "body": ...} posts, all of them in one transaction or none.
+
+    Answers 201 with the new posts' ids in the order given, or 400 with PostForm's errors by list index.
+    """
+    config = current_app.config
+    request.max_content_length = config['POSTS_API_MAX_BYTES']
+    if not request.is_json:
+        return api_error(415, "Send the posts as application/json.")
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return api_error(400, "Send a non-empty list of posts.")
+    if len(items) > config['POSTS_API_MAX_BATCH']:
+        return api_error(413, f"Send at most {config['POSTS_API_MAX_BATCH']} posts per request.")
+    errors = {str(index): item_errors for index, item_errors in enumerate(map(post_errors, items)) if item_errors}
+    if errors:
+        return jsonify(error="No posts were created.", posts=errors), 400
+
+    user = flask_login.current_user
+    fernet = user.fernet  # the author's key is derived once for the whole batch
+    now = datetime.now()
+    rows = [{'userid': user.id, 'created': now, 'title': fernet.encrypt(item['title'].encode()),
+             'body': fernet.encrypt(item['body'].encode())} for item in items]
+    ids = db.session.scalars(insert(Post).returning(Post.id, sort_by_parameter_order=True), rows).all()
+    terms = [{'token': token, 'post_id': post_id, 'weight': weight} for post_id, item in zip(ids, items)
+             for token, weight in blind_index.weights(item['title'], item['body']).items()]
+    if terms:
+        db.session.execute(insert(PostTerm), terms)
+    # A bulk insert skips the mapper events that bump the feed for single posts.
+    FeedVersion.bump(db.session.connection(), 'posts')
+    db.session.commit()
+
+    logger.info("Posts Created", extra={'email': user.email, 'role': user.role, 'post_id': ids,
+                                        'url': '/api/posts', 'ip': flask.request.remote_addr})
+    return jsonify(ids=ids), 201
+
+
+def post_errors(item):
+    """The errors PostForm finds in one post of the list, as /create would for its form."""
+    if not isinstance(item, dict):
+        return {'post': ["Must be an object with a title and a body."]}
+    wrong_types = {field: ["Must be a string."] for field in ('title', 'body')
+                   if not isinstance(item.get(field, ''), str)}
+    if wrong_types:
+        return wrong_types
+    form = PostForm(formdata=None, data=item, meta={'csrf': False})
+    form.validate()
+    return form.errors
+
+
+def api_error(status, message):
+    return jsonify(error=message), status
+
+
+@posts_api_bp.errorhandler(401)
+@posts_api_bp.errorhandler(403)
+@posts_api_bp.errorhandler(413)
+@posts_api_bp.errorhandler(429)
+def http_error(e):
+    return api_error(e.code, e.description)
@@ -1,10 +1,19 @@
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import flask
 import flask_login
-from flask import Blueprint, render_template, flash, url_for, redirect
-from config import db, Post, roles_required, logger
+from flask import Blueprint, render_template, flash, url_for, redirect, request, current_app
+from config import db, async_db, Post, PostTerm, User, FeedVersion, blind_index, roles_required, conditional, logger, \
+    card_cache, metrics
 from posts.forms import PostForm
-from sqlalchemy import desc
+from streaming import stream_page
+from sqlalchemy import desc, asc, select
+from sqlalchemy.orm import joinedload
 from flask_login import login_required
+from markupsafe import Markup
 
 posts_bp = Blueprint('posts', __name__, template_folder='templates')
 
@@ -16,23 +25,225 @@ def create():
     if form.validate_on_submit():
         user = flask_login.current_user
         new_post = Post(userid=user.id ,title=user.encrypt(form.title.data), body=user.encrypt(form.body.data))
+        new_post.index_terms(form.title.data, form.body.data)
 
         db.session.add(new_post)
         db.session.commit()
 
-        logger.info(f"Post Created. Email: {user.email} Role: {user.role} Post ID: {new_post.id} "
-                    f"IP: {flask.request.remote_addr}")
+        logger.info("Post Created", extra={'email': user.email, 'role': user.role, 'post_id': new_post.id,
+                                           'ip': flask.request.remote_addr})
 
         flash('Post created', category='success')
         return redirect(url_for('posts.posts'))
     return render_template('posts/create.html', form=form)
 
+def feed_validator():
+    version, modified = FeedVersion.current('posts')
+    return version, modified
+
+
 @posts_bp.route('/posts')
 @login_required
 @roles_required("/posts","end_user")
+@conditional(feed_validator)
 def posts():
-    all_posts = Post.query.order_by(desc('id')).all()
-    return render_template('posts/posts.html', posts=all_posts)
+    limit, q = feed_args()
+    return stream_page('posts/posts.html', feed=requested_feed(limit, q), limit=limit, q=q)
+
+
+@login_required
+@roles_required("/posts","end_user")
+@conditional(feed_validator)
+async def posts_async():
+    """posts() for the async mode: rows are read on the event loop, cards decrypted and rendered in a thread."""
+    limit, q = feed_args()
+    async with async_db.session() as session:
+        feed, batches = await session.run_sync(lambda sync_session: read_feed(requested_feed(limit, q, sync_session)))
+    cards = await asyncio.to_thread(lambda: [card for batch in batches for card in render_cards(batch)])
+    return await asyncio.to_thread(render_template, 'posts/posts.html', feed=RenderedFeed(cards, feed),
+                                   limit=limit, q=q)
+
+
+def feed_args():
+    limit = request.args.get('limit', current_app.config['POSTS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, current_app.config['POSTS_MAX_PER_PAGE']))
+    return limit, request.args.get('q', '').strip()
+
+
+def requested_feed(limit, q, session=None):
+    if q:
+        return SearchFeed(q, session)
+    return PostFeed(limit, before=request.args.get('before', type=int), after=request.args.get('after', type=int),
+                    session=session)
+
+
+def read_feed(feed):
+    return feed, list(feed.batches())
+
+
+# Authors are joined into the feed queries together with any pending key rotation, which decryption needs.
+AUTHORS = joinedload(Post.user).joinedload(User.rotation)
+
+
+class PostFeed:
+    """One page of the feed, newest first, read, decrypted and rendered a batch at a time as it is iterated.
+
+    Keyset pagination on Post.id, authors are joined into the same query. prev_cursor and next_cursor are
+    known once the page has been iterated, which the template does before drawing the page links.
+    """
+
+    def __init__(self, limit, before=None, after=None, session=None):
+        self.limit = limit
+        self.before = before
+        self.after = after
+        self.session = session or db.session
+        self.prev_cursor = None
+        self.next_cursor = None
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from render_cards(batch)
+
+    def batches(self):
+        """The page's posts, read POSTS_BATCH_SIZE at a time."""
+        query = select(Post).options(AUTHORS).order_by(desc(Post.id))
+        if self.after is not None:
+            # Find the newest post of the page first, so the page itself can be read newest first too.
+            ids = self.session.scalars(select(Post.id).where(Post.id > self.after)
+                                       .order_by(asc(Post.id)).limit(self.limit + 1)).all()
+            if not ids:
+                return
+            newer = len(ids) > self.limit
+            older = None
+            query = query.where(Post.id > self.after, Post.id <= ids[:self.limit][-1]).limit(self.limit)
+        else:
+            if self.before is not None:
+                query = query.where(Post.id < self.before)
+            newer = None
+            older = False
+            query = query.limit(self.limit + 1)  # one more row than shown tells whether there is an older page
+
+        batch_size = current_app.config['POSTS_BATCH_SIZE']
+        first = last = None
+        shown = 0
+        for batch in self.session.execute(query.execution_options(yield_per=batch_size)).scalars().partitions():
+            if shown + len(batch) > self.limit:
+                older = True
+                batch = batch[:self.limit - shown]
+            if not batch:
+                break
+            first = first if first is not None else batch[0].id
+            last = batch[-1].id
+            shown += len(batch)
+            yield batch
+
+        if first is None:
+            return
+        if newer is None:
+            newer = has_posts(self.session, Post.id > first)
+        if older is None:
+            older = has_posts(self.session, Post.id < last)
+        self.prev_cursor = first if newer else None
+        self.next_cursor = last if older else None
+
+
+class SearchFeed:
+    """Posts matching a search query through the blind index, best match first, as one page without cursors."""
+
+    prev_cursor = None
+    next_cursor = None
+
+    def __init__(self, query, session=None):
+        self.query = query
+        self.session = session or db.session
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from render_cards(batch)
+
+    def batches(self):
+        config = current_app.config
+        ids = PostTerm.search(blind_index.query_tokens(self.query, config['SEARCH_MAX_TERMS']),
+                              limit=config['SEARCH_RESULTS'], max_postings=config['SEARCH_MAX_POSTINGS'],
+                              session=self.session)
+        batch_size = config['POSTS_BATCH_SIZE']
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            found = {post.id: post for post in
+                     self.session.scalars(select(Post).options(AUTHORS).where(Post.id.in_(batch)))}
+            yield [found[post_id] for post_id in batch if post_id in found]
+
+
+class RenderedFeed(list):
+    """The rendered cards of a feed page read ahead of rendering it, with the page's cursors."""
+
+    def __init__(self, cards, feed):
+        super().__init__(cards)
+        self.prev_cursor = feed.prev_cursor
+        self.next_cursor = feed.next_cursor
+
+
+def has_posts(session, condition):
+    return session.query(Post.id).filter(condition).limit(1).scalar() is not None
+
+
+# DECRYPTION STAGE
+PostCard = namedtuple('PostCard', ['id', 'userid', 'author', 'created', 'title', 'body'])
+RenderedCard = namedtuple('RenderedCard', ['id', 'userid', 'html'])
+
+_executor_lock = threading.Lock()
+
+
+def decrypt_executor():
+    with _executor_lock:
+        if 'decrypt_executor' not in current_app.extensions:
+            current_app.extensions['decrypt_executor'] = ThreadPoolExecutor(
+                max_workers=current_app.config['POST_DECRYPT_WORKERS'], thread_name_prefix='post-decrypt')
+        return current_app.extensions['decrypt_executor']
+
+
+def decrypt_posts(posts):
+    """Decrypt a page of posts into plain PostCards, deriving each author's key once."""
+    fernets = {}
+    for post in posts:
+        if post.userid not in fernets:
+            fernets[post.userid] = post.user.fernet
+
+    tokens = []
+    for post in posts:
+        tokens += [(fernets[post.userid], post.title), (fernets[post.userid], post.body)]
+    metrics.count('decrypt', len(tokens))
+
+    if current_app.config['POST_DECRYPT_MODE'] == 'parallel' and len(tokens) > 1:
+        plaintexts = list(decrypt_executor().map(decrypt_token, tokens))
+    else:
+        plaintexts = [decrypt_token(token) for token in tokens]
+
+    return [PostCard(id=post.id, userid=post.userid, author=post.user.firstname + " " + post.user.lastname,
+                     created=post.created, title=plaintexts[2 * i], body=plaintexts[2 * i + 1])
+            for i, post in enumerate(posts)]
+
+
+def render_cards(posts):
+    """Render the viewer-independent part of each card, decrypting only posts missing from card_cache."""
+    fragments = {}
+    for post in posts:
+        html = card_cache.get(post.card_key)
+        if html is not None:
+            fragments[post.id] = html
+
+    misses = [post for post in posts if post.id not in fragments]
+    for post, card in zip(misses, decrypt_posts(misses)):
+        html = render_template('posts/card.html', post=card)
+        card_cache.put(post.card_key, html)
+        fragments[post.id] = html
+
+    return [RenderedCard(id=post.id, userid=post.userid, html=Markup(fragments[post.id])) for post in posts]
+
+
+def decrypt_token(job):
+    fernet, token = job
+    return fernet.decrypt(token).decode()
 
 @posts_bp.route('/<int:id>/update', methods=('GET', 'POST'))
 @login_required
@@ -47,11 +258,14 @@ def update(id):
         form = PostForm()
 
         if form.validate_on_submit():
+            post_to_update.index_terms(form.title.data, form.body.data)
             post_to_update.update(title=user.encrypt(form.title.data), body=user.encrypt(form.body.data))
 
             flash('Post updated', category='success')
-            logger.info(f"Post Updated. Email: {user.email} Role: {user.role} Post ID: {post_to_update.id} "
-                        f"Author Email: {post_to_update.user.email} IP: {flask.request.remote_addr}")
+            logger.info("Post Updated", extra={'email': user.email, 'role': user.role,
+                                               'post_id': post_to_update.id,
+                                               'author_email': post_to_update.user.email,
+                                               'ip': flask.request.remote_addr})
             return redirect(url_for('posts.posts'))
 
         form.title.data = user.decrypt(post_to_update.title)
@@ -71,8 +285,10 @@ def delete(id):
     if not post_to_delete:
         return redirect(url_for('posts.posts'))
     if post_to_delete.user.id == user.id:
-        logger.info(f"Post Deleted. Email: {user.email} Role: {user.role} Post ID: {post_to_delete.id} "
-                    f"Author Email: {post_to_delete.user.email} IP: {flask.request.remote_addr}")
+        logger.info("Post Deleted", extra={'email': user.email, 'role': user.role, 'post_id': post_to_delete.id,
+                                           'author_email': post_to_delete.user.email,
+                                           'ip': flask.request.remote_addr})
+        card_cache.discard(post_to_delete.card_key)
         db.session.delete(post_to_delete)
         db.session.commit()
         flash('Post deleted', category='success')
@@ -0,0 +1,47 @@
+import hashlib
+import hmac
+import re
+import unicodedata
+from collections import Counter
+
+TERM = re.compile(r'\w+')
+
+
+class BlindIndex:
+    """Turns post text into search tokens: a keyed HMAC of each normalised term, so posts can be searched without
+    the database holding any plaintext.
+
+    Equal terms give equal tokens, so a search is an exact token lookup. Without the key the tokens cannot be
+    matched to words, although how often each token occurs is visible.
+    """
+
+    TITLE_WEIGHT = 3  # a term in the title counts as much as three in the body
+    MIN_TERM = 2
+    MAX_TERM = 40
+
+    def __init__(self, key=b''):
+        self.key = key
+
+    def configure(self, key):
+        self.key = key
+
+    def terms(self, text):
+        """Words of `text`, case-folded and NFKC normalised so that e.g. 'Café' and 'CAFÉ' match."""
+        text = unicodedata.normalize('NFKC', text).casefold()
+        return [term for term in TERM.findall(text) if self.MIN_TERM <= len(term) <= self.MAX_TERM]
+
+    def token(self, term):
+        return hmac.new(self.key, term.encode(), hashlib.sha256).digest()[:16]
+
+    def weights(self, title, body):
+        """{token: weight} for a post: how often each term occurs, title occurrences counting TITLE_WEIGHT times."""
+        counts = Counter()
+        for term in self.terms(title):
+            counts[term] += self.TITLE_WEIGHT
+        for term in self.terms(body):
+            counts[term] += 1
+        return {self.token(term): weight for term, weight in counts.items()}
+
+    def query_tokens(self, query, max_terms):
+        """Distinct tokens of a search query, at most max_terms of them."""
+        return list(dict.fromkeys(self.token(term) for term in self.terms(query)))[:max_terms]
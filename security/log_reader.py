@@ -0,0 +1,179 @@
+import glob
+import json
+import mmap
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+LEGACY_LINE = re.compile(r"^(?P<time>\d\d/\d\d/\d{4} \d\d:\d\d:\d\d [AP]M) : (?P<event>[^.]*)\.")
+LEGACY_FIELDS = {'email': re.compile(r"Email: (\S+)"), 'ip': re.compile(r"IP: ?(\S+)")}
+
+
+class LogIndex:
+    """Persistent offset index over the security log and its rotated siblings (security.log.1, ...).
+
+    Line starts, timestamps, event types, emails and IPs are kept in a small SQLite file next to
+    the log. refresh() only reads bytes appended since the last run, files are tracked by inode
+    so renames during rotation keep their index, and page() reads just the requested lines back
+    out of memory-mapped log files. The distinct event types are kept in a table of their own, so
+    listing them does not grow with the log either.
+    """
+
+    def __init__(self, log_path, index_path=None):
+        self.log_path = log_path
+        self.index_path = index_path or log_path + '.idx'
+        self._indexed = None  # (path, inode, size, mtime) of each log file as of this process's last refresh
+        with closing(self._connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (inode INTEGER PRIMARY KEY, path TEXT, indexed_upto INTEGER);
+                CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY AUTOINCREMENT, inode INTEGER,
+                                                  offset INTEGER, length INTEGER, time TEXT, event TEXT,
+                                                  email TEXT, ip TEXT);
+                CREATE INDEX IF NOT EXISTS ix_lines_time ON lines (time);
+                CREATE INDEX IF NOT EXISTS ix_lines_event ON lines (event, id);
+                CREATE INDEX IF NOT EXISTS ix_lines_email ON lines (email, id);
+                CREATE INDEX IF NOT EXISTS ix_lines_ip ON lines (ip, id);
+                CREATE TABLE IF NOT EXISTS events (event TEXT PRIMARY KEY);
+            """)
+            if conn.execute("SELECT 1 FROM events LIMIT 1").fetchone() is None:
+                # Index files written before the events table, filled once.
+                conn.execute("INSERT OR IGNORE INTO events SELECT DISTINCT event FROM lines WHERE event IS NOT NULL")
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+
+    def log_files(self):
+        """Existing log files, oldest rotation first."""
+        rotated = [path for path in glob.glob(glob.escape(self.log_path) + '.*') if re.search(r'\.\d+$', path)]
+        rotated.sort(key=lambda path: int(path.rsplit('.', 1)[1]), reverse=True)
+        return [path for path in rotated + [self.log_path] if os.path.exists(path)]
+
+    def refresh(self):
+        # The write lock is only taken once a log file has changed since this process last indexed it.
+        if self._signature() == self._indexed:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            known = {inode: upto for inode, upto in conn.execute("SELECT inode, indexed_upto FROM files")}
+            signature = self._signature()
+            seen = set()
+            for path, inode, size, _ in signature:
+                seen.add(inode)
+                upto = known.get(inode, 0)
+                if size < upto:
+                    # Truncated or replaced under the same inode, start again.
+                    conn.execute("DELETE FROM lines WHERE inode = ?", (inode,))
+                    upto = 0
+                if size > upto:
+                    upto = self._index_file(conn, path, inode, upto)
+                conn.execute("INSERT OR REPLACE INTO files (inode, path, indexed_upto) VALUES (?, ?, ?)",
+                             (inode, path, upto))
+            for inode in set(known) - seen:
+                conn.execute("DELETE FROM lines WHERE inode = ?", (inode,))
+                conn.execute("DELETE FROM files WHERE inode = ?", (inode,))
+            if set(known) - seen or any(size < known.get(inode, 0) for _, inode, size, _ in signature):
+                conn.execute("DELETE FROM events WHERE NOT EXISTS "
+                             "(SELECT 1 FROM lines WHERE lines.event = events.event)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._indexed = signature
+
+    def _signature(self):
+        signature = []
+        for path in self.log_files():
+            stat = os.stat(path)
+            signature.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return signature
+
+    def _index_file(self, conn, path, inode, start):
+        rows = []
+        with open(path, 'rb') as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = start
+            while True:
+                end = mm.find(b'\n', offset)
+                if end == -1:
+                    # Partial last line, pick it up on the next refresh.
+                    break
+                fields = parse_line(mm[offset:end].decode('utf-8', 'replace'))
+                if fields:
+                    rows.append((inode, offset, end - offset, fields.get('time'), fields.get('event'),
+                                 fields.get('email'), fields.get('ip')))
+                offset = end + 1
+        conn.executemany("INSERT INTO lines (inode, offset, length, time, event, email, ip) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR IGNORE INTO events (event) VALUES (?)",
+                         [(event,) for event in {row[4] for row in rows} if event is not None])
+        return offset
+
+    def events(self):
+        with closing(self._connect()) as conn:
+            return [event for (event,) in conn.execute("SELECT event FROM events ORDER BY event")]
+
+    def page(self, email=None, ip=None, event=None, since=None, until=None, before=None, limit=25):
+        """Newest-first page of parsed log entries matching the filters, plus the cursor for the next page."""
+        conditions, params = [], []
+        for column, value in (('email', email), ('ip', ip), ('event', event)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            conditions.append("time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("time < ?")
+            params.append(until)
+        if before:
+            conditions.append("lines.id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT lines.id, files.path, offset, length FROM lines "
+                                f"JOIN files ON files.inode = lines.inode {where} "
+                                f"ORDER BY lines.id DESC LIMIT ?", params + [limit + 1]).fetchall()
+
+        entries = []
+        maps = {}
+        try:
+            for row_id, path, offset, length in rows[:limit]:
+                if path not in maps:
+                    with open(path, 'rb') as log_file:
+                        maps[path] = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+                entry = parse_line(maps[path][offset:offset + length].decode('utf-8', 'replace'))
+                entry['id'] = row_id
+                entries.append(entry)
+        finally:
+            for mm in maps.values():
+                mm.close()
+
+        next_cursor = entries[-1]['id'] if len(rows) > limit else None
+        return entries, next_cursor
+
+
+def parse_line(line):
+    """Parse a JSON log line, or a line in the older '<time> : <message>' text format."""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith('{'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    match = LEGACY_LINE.match(line)
+    if not match:
+        return {'event': line}
+    fields = {'time': datetime.strptime(match['time'], '%d/%m/%Y %I:%M:%S %p').isoformat(),
+              'event': match['event'], 'message': line}
+    for field, pattern in LEGACY_FIELDS.items():
+        found = pattern.search(line)
+        if found:
+            fields[field] = found.group(1)
+    return fields
@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a security event as one JSON line, keeping the structured fields passed in `extra`."""
+
+    fields = ('email', 'role', 'ip', 'url', 'post_id', 'author_email', 'attempts')
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='seconds'),
+                 'event': record.getMessage()}
+        for field in self.fields:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        return json.dumps(entry)
+
+
+class BatchingFileHandler(logging.Handler):
+    """Logging handler that queues formatted records and appends them to a file from a background thread.
+
+    The writer flushes once `batch_size` records are waiting or `flush_interval` seconds have passed.
+    If the queue is full the record is dropped and counted in `dropped` rather than blocking the request.
+    The file is opened and the writer started on the first record, so an idle process never touches the file.
+    """
+
+    def __init__(self, filename, queue_size=10000, batch_size=100, flush_interval=1.0):
+        super().__init__()
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._start_lock = threading.Lock()
+
+    def emit(self, record):
+        if self._writer is None:
+            with self._start_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_batches, name='security-log-writer',
+                                                    daemon=True)
+                    self._writer.start()
+        try:
+            self.queue.put_nowait(self.format(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self.queue.put(_STOP)
+            self._writer.join()
+        super().close()
+
+    def _write_batches(self):
+        with open(self.filename, 'a', encoding='utf-8') as log_file:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    line = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    line = None
+
+                if line is not None and line is not _STOP:
+                    batch.append(line)
+                if batch and (line is _STOP or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    log_file.write('\n'.join(batch) + '\n')
+                    log_file.flush()
+                    batch = []
+                if line is _STOP:
+                    return
+                if time.monotonic() >= deadline:
+                    deadline = time.monotonic() + self.flush_interval
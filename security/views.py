@@ -1,53 +1,149 @@
-from flask import Blueprint, render_template
-from flask_login import login_required
-from sqlalchemy import asc
+import asyncio
 import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, request, url_for, render_template, Response
+from flask_sqlalchemy.pagination import QueryPagination
+from flask_login import login_required
+from sqlalchemy import asc, desc
+from sqlalchemy.orm import contains_eager
 
-from config import roles_required, Log, logger
+from config import async_db, db, roles_required, conditional, Log, User, EventCount, FeedVersion, logger, metrics
+from security.log_reader import LogIndex
+from streaming import stream_page
 
 security_bp = Blueprint('security', __name__, template_folder='templates')
 
+_log_index_lock = threading.Lock()
+
+USER_LOG_SORTS = {'id': Log.id, 'login': Log.latest_login, 'ip': Log.latest_login_ip, 'role': User.role}
+
+
+def security_validator():
+    """Version of everything /security shows: the tables, the log files and the bucket the time windows end in."""
+    version, modified = FeedVersion.current('security')
+    files = [(path, stat.st_ino, stat.st_size) for path, stat in
+             ((path, os.stat(path)) for path in log_index().log_files())]
+    return (version, files, EventCount.bucket_start(datetime.now())), modified
+
+
 @security_bp.route('/security')
 @login_required
 @roles_required("/security", "sec_admin")
+@conditional(security_validator, shows_flashes=False)
 def security():
-    all_logs = Log.query.order_by(asc('id')).all()
-    log_file = open('security.log', 'r')
-    recent_log_file = tail(log_file, 10)
-    recent_log_file.reverse()
-    log_file.close()
-    return render_template('security/security.html', logs=all_logs, logfile=recent_log_file)
-
-
-# with thanks to glenbot on stackoverflow (https://stackoverflow.com/a/13790289)
-def tail(f, lines=1, _buffer=4098):
-    """Tail a file and get X lines from the end"""
-    # place holder for the lines found
-    lines_found = []
-
-    # block counter will be multiplied by buffer
-    # to get the block size from the end
-    block_counter = -1
-
-    # loop until we find X lines
-    while len(lines_found) < lines:
-        try:
-            f.seek(block_counter * _buffer, os.SEEK_END)
-        except IOError:  # either file is too small, or too many lines requested
-            f.seek(0)
-            lines_found = f.readlines()
-            break
-
-        lines_found = f.readlines()
-
-        # we found enough lines, get out
-        # Removed this line because it was redundant the while will catch
-        # it, I left it for history
-        # if len(lines_found) > lines:
-        #    break
-
-        # decrement the block counter to get the
-        # next X bytes
-        block_counter -= 1
-
-    return lines_found[-lines:]
\ No newline at end of file
+    user_filters, user_sort, user_order, page = user_log_args()
+    user_logs = user_log_page(user_filters, user_sort, user_order, page)
+    return stream_page('security/security.html', logs=user_logs, user_filters=user_filters,
+                       user_sort=user_sort, user_order=user_order, aggregates=aggregates(),
+                       page_url=page_url, **log_page())
+
+
+@login_required
+@roles_required("/security", "sec_admin")
+@conditional(security_validator, shows_flashes=False)
+async def security_async():
+    """security() for the async mode: the tables are read on the event loop while the log is read in a thread."""
+    user_filters, user_sort, user_order, page = user_log_args()
+
+    def read_tables(session):
+        return user_log_page(user_filters, user_sort, user_order, page, session), aggregates(session)
+
+    async with async_db.session() as session:
+        (user_logs, totals), log = await asyncio.gather(session.run_sync(read_tables), asyncio.to_thread(log_page))
+    return await asyncio.to_thread(render_template, 'security/security.html', logs=user_logs,
+                                   user_filters=user_filters, user_sort=user_sort, user_order=user_order,
+                                   aggregates=totals, page_url=page_url, **log)
+
+
+def user_log_args():
+    user_filters = {field: request.args.get(field) or None
+                     for field in ('role', 'login_ip', 'login_since', 'login_until')}
+    user_sort = request.args.get('sort') if request.args.get('sort') in USER_LOG_SORTS else 'id'
+    user_order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+    return user_filters, user_sort, user_order, request.args.get('page', 1, type=int)
+
+
+def aggregates(session=None):
+    return {
+        'failed_ip_hour': EventCount.totals('failed_login_ip', timedelta(hours=1), session=session),
+        'failed_ip_day': EventCount.totals('failed_login_ip', timedelta(days=1), session=session),
+        'failed_email_hour': EventCount.totals('failed_login_email', timedelta(hours=1), session=session),
+        'failed_email_day': EventCount.totals('failed_login_email', timedelta(days=1), session=session),
+        'lockouts_day': EventCount.totals('lockout', timedelta(days=1), session=session),
+        'registrations': EventCount.daily('registration', session=session),
+    }
+
+
+def log_page():
+    """The requested page of the security log file, with what the template shows around it."""
+    index = log_index()
+    index.refresh()
+    filters = {field: request.args.get(field) or None for field in ('email', 'ip', 'event', 'since', 'until')}
+    entries, next_cursor = index.page(email=filters['email'], ip=filters['ip'], event=filters['event'],
+                                      since=parse_time(filters['since']), until=parse_time(filters['until']),
+                                      before=request.args.get('before', type=int),
+                                      limit=current_app.config['SECURITY_LOG_PAGE_SIZE'])
+    return {'entries': entries, 'events': index.events(), 'filters': filters, 'next_cursor': next_cursor}
+
+
+@security_bp.route('/metrics')
+@login_required
+@roles_required("/metrics", "sec_admin")
+def metrics_text():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def page_url(**changes):
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for('security.security', **{field: value for field, value in args.items() if value})
+
+
+def user_log_page(filters, sort, order, page, session=None):
+    """A page of user logs. Read while the page renders, or straight away from an explicit session."""
+    query = (session.query(Log) if session else Log.query).join(Log.user).options(contains_eager(Log.user))
+    if filters['role']:
+        query = query.filter(User.role == filters['role'])
+    if filters['login_ip']:
+        query = query.filter(Log.latest_login_ip == filters['login_ip'])
+    if parse_time(filters['login_since']):
+        query = query.filter(Log.latest_login >= datetime.fromisoformat(filters['login_since']))
+    if parse_time(filters['login_until']):
+        query = query.filter(Log.latest_login < datetime.fromisoformat(filters['login_until']))
+    direction = desc if order == 'desc' else asc
+    query = query.order_by(direction(USER_LOG_SORTS[sort]), direction(Log.id))
+    pagination = QueryPagination if session else StreamedPagination
+    return pagination(query=query, page=page, per_page=current_app.config['SECURITY_USERS_PER_PAGE'],
+                      max_per_page=None, error_out=False)
+
+
+class StreamedPagination(QueryPagination):
+    """Query pagination whose items are read from the database in batches while the page is rendered."""
+
+    def _query_items(self):
+        query = self._query_args['query'].limit(self.per_page).offset(self._query_offset)
+        batch_size = current_app.config['SECURITY_USERS_BATCH_SIZE']
+
+        def items():
+            # The view's session is closed once it returns, so the rows are read through the session of the
+            # context the stream runs in, which is removed, with its connection, when the stream ends.
+            yield from query.with_session(db.session()).yield_per(batch_size)
+        return items()
+
+
+def log_index():
+    # Built on first use rather than in create_app(), as opening it creates the index file.
+    with _log_index_lock:
+        if 'log_index' not in current_app.extensions:
+            current_app.extensions['log_index'] = LogIndex(current_app.config['SECURITY_LOG_FILE'],
+                                                           current_app.config['SECURITY_LOG_INDEX'])
+        return current_app.extensions['log_index']
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value).isoformat(timespec='seconds') if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,36 @@
+from flask import Response, current_app, get_flashed_messages, stream_template
+from markupsafe import Markup
+
+# Templates output {{ flush }} where everything rendered so far should be sent straight away, e.g. after the
+# page header. The marker itself is never sent.
+FLUSH = Markup('<!-- flush -->')
+
+
+def stream_page(template_name, **context):
+    """Render a template as a streamed response, sent in writes of about STREAM_BUFFER_SIZE characters.
+
+    Flash messages are read before the response starts: the session cookie goes out with the headers, so
+    messages popped while the body streams would be shown again on the next page.
+    """
+    get_flashed_messages()
+    chunks = stream_template(template_name, flush=FLUSH, **context)
+    return Response(buffered(chunks, current_app.config['STREAM_BUFFER_SIZE']), mimetype='text/html')
+
+
+def buffered(chunks, size):
+    """Join the many small chunks Jinja generates into strings of at least `size` characters."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        if chunk == FLUSH:
+            if buffer:
+                yield ''.join(buffer)
+                buffer, length = [], 0
+            continue
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,70 @@
+import pytest
+from flask.testing import FlaskClient
+
+from config import create_app, db, User, ph
+
+# Talisman redirects plain http requests, so the test client talks https.
+BASE_URL = 'https://localhost'
+PASSWORD = 'Passw0rd!'
+
+
+class Client(FlaskClient):
+    """Reads each response to the end as it is made, so streamed pages close in order as on a server."""
+
+    def open(self, *args, buffered=True, **kwargs):
+        return super().open(*args, buffered=buffered, **kwargs)
+
+
+def make_app(path, **config):
+    """An app on a new SQLite database, writing its files under path."""
+    path.mkdir(exist_ok=True)
+    app = create_app({'TESTING': True, 'SECRET_KEY': 'test', 'WTF_CSRF_ENABLED': False, 'RATELIMIT_ENABLED': False,
+                      'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path / 'blog.sqlite'}",
+                      'SECURITY_LOG_FILE': str(path / 'security.log'),
+                      'LOGIN_THROTTLE_STATE': str(path / 'login_throttle.db'),
+                      'COMPRESSION_STATIC_DIR': str(path / 'static_compressed'), **config})
+    app.test_client_class = Client
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def close_app(app):
+    app.extensions['security_log'].close()
+    app.extensions['login_throttle'].persist_path = None
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    yield app
+    close_app(app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app, monkeypatch):
+    """An end_user with MFA set up, whose PIN is not checked."""
+    monkeypatch.setattr(User, 'verify_pin', lambda self, pin: True)
+    with app.app_context():
+        user = User('user@example.com', 'Test', 'User', '0191-1234567', ph.hash(PASSWORD))
+        user.mfa_enabled = True
+        db.session.add(user)
+        db.session.commit()
+        user.generate_log()
+        return user.id
+
+
+@pytest.fixture
+def logged_in(client, user):
+    # Following the redirect shows the login's flash message, so later pages are plain.
+    response = client.post(BASE_URL + '/login', data={'email': 'user@example.com', 'password': PASSWORD,
+                                                      'pin': '123456'}, follow_redirects=True)
+    assert response.request.path == '/posts', response.request.path
+    return client
@@ -0,0 +1,15 @@
+from conftest import BASE_URL, close_app, make_app
+
+
+def test_pages_with_a_csrf_token_are_not_compressed(tmp_path):
+    app = make_app(tmp_path, WTF_CSRF_ENABLED=True, COMPRESSION_MIN_SIZE=0)
+    try:
+        client = app.test_client()
+        for path in ('/login', '/registration'):
+            response = client.get(BASE_URL + path, headers={'Accept-Encoding': 'gzip'})
+            assert b'csrf_token' in response.data
+            assert 'Content-Encoding' not in response.headers
+        response = client.get(BASE_URL + '/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+    finally:
+        close_app(app)
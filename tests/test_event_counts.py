@@ -0,0 +1,16 @@
+from datetime import datetime, timedelta
+
+from config import db, EventCount
+
+
+def test_totals_count_only_buckets_inside_the_window(app):
+    now = datetime.now()
+    with app.app_context():
+        for minutes_ago, count in ((70, 100), (50, 10), (5, 1)):
+            bucket = EventCount.bucket_start(now - timedelta(minutes=minutes_ago))
+            row = EventCount('failed_login_ip', '10.0.0.1', bucket)
+            row.count = count
+            db.session.add(row)
+        db.session.commit()
+        assert EventCount.totals('failed_login_ip', timedelta(hours=1)) == [('10.0.0.1', 11)]
+        assert EventCount.totals('failed_login_ip', timedelta(days=1)) == [('10.0.0.1', 111)]
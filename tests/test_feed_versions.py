@@ -0,0 +1,40 @@
+from conftest import BASE_URL
+from config import db, Post, User
+
+
+def revalidate(client, etag):
+    return client.get(BASE_URL + '/posts', headers={'If-None-Match': etag})
+
+
+def test_posts_page_is_not_modified_until_a_post_changes(app, logged_in, user):
+    etag = logged_in.get(BASE_URL + '/posts').headers['ETag']
+    assert revalidate(logged_in, etag).status_code == 304
+
+    # Following the redirect shows the "created" flash message, which would otherwise force a full page.
+    logged_in.post(BASE_URL + '/create', data={'title': 'First post', 'body': 'Hello'}, follow_redirects=True)
+    response = revalidate(logged_in, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    etag = response.headers['ETag']
+    assert revalidate(logged_in, etag).status_code == 304
+
+    with app.app_context():
+        post = db.session.scalars(db.select(Post)).one()
+        post.title = db.session.get(User, user).encrypt('Edited post')
+        db.session.commit()
+    response = revalidate(logged_in, etag)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    with app.app_context():
+        db.session.delete(db.session.scalars(db.select(Post)).one())
+        db.session.commit()
+    assert revalidate(logged_in, etag).status_code == 200
+
+
+def test_changing_one_feed_leaves_the_other_not_modified(app, logged_in, user):
+    etag = logged_in.get(BASE_URL + '/posts').headers['ETag']
+    with app.app_context():
+        db.session.get(User, user).log.latest_login_ip = '10.0.0.1'
+        db.session.commit()
+    assert revalidate(logged_in, etag).status_code == 304
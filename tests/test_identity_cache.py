@@ -0,0 +1,36 @@
+from sqlalchemy.orm import Session
+
+from conftest import BASE_URL
+from config import db, Log, User
+
+
+def test_deleting_a_user_logs_them_out(app, logged_in, user):
+    with app.app_context():
+        db.session.delete(db.session.scalars(db.select(Log).filter_by(user_id=user)).one())
+        db.session.delete(db.session.get(User, user))
+        db.session.commit()
+        assert db.session.get(User, user) is None
+    response = logged_in.get(BASE_URL + '/posts')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_next_request_sees_a_changed_role(app, logged_in, user):
+    assert logged_in.get(BASE_URL + '/security').status_code == 403
+    with app.app_context():
+        db.session.get(User, user).role = 'sec_admin'
+        db.session.commit()
+    assert logged_in.get(BASE_URL + '/security').status_code == 200
+
+
+def test_request_between_flush_and_commit_does_not_keep_the_old_role(app, logged_in, user):
+    with app.app_context():
+        engine = db.engine
+    with Session(engine) as session:
+        session.get(User, user).role = 'sec_admin'
+        session.flush()
+        # This request still reads the committed end_user row and caches it.
+        assert logged_in.get(BASE_URL + '/security').status_code == 403
+        with app.app_context():
+            session.commit()
+    assert logged_in.get(BASE_URL + '/security').status_code == 200
@@ -0,0 +1,47 @@
+import pytest
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from config import db, KeyRotation, Post, User, ph
+
+
+def test_interrupted_rotation_resumes_from_its_checkpoint(app, user, monkeypatch):
+    with app.app_context():
+        author = db.session.get(User, user)
+        db.session.add_all([Post(user, author.encrypt(f'title {i}'), author.encrypt(f'body {i}')) for i in range(5)])
+        db.session.commit()
+        post_ids = db.session.scalars(db.select(Post.id).order_by(Post.id)).all()
+        assert author.change_password(ph.hash('N3w-Passw0rd!'))
+        db.session.commit()
+
+        # Stop the job in its second batch, after the first one and its checkpoint were committed.
+        rotate = MultiFernet.rotate
+        calls = []
+
+        def failing_rotate(self, token):
+            calls.append(token)
+            if len(calls) > 4:
+                raise RuntimeError("interrupted")
+            return rotate(self, token)
+
+        monkeypatch.setattr(MultiFernet, 'rotate', failing_rotate)
+        with pytest.raises(RuntimeError):
+            db.session.get(KeyRotation, user).run(batch_size=2)
+        db.session.rollback()
+
+        rotation = db.session.get(KeyRotation, user)
+        assert rotation.last_post_id == post_ids[1]
+        new_key, old_key = Fernet(author.key), Fernet(rotation.old_key)
+        for post in db.session.scalars(db.select(Post).order_by(Post.id)):
+            moved = post.id <= rotation.last_post_id
+            assert (new_key if moved else old_key).decrypt(post.title)
+            with pytest.raises(InvalidToken):
+                (old_key if moved else new_key).decrypt(post.title)
+
+        # Resuming only rotates the posts after the checkpoint, then drops the rotation.
+        calls.clear()
+        monkeypatch.setattr(MultiFernet, 'rotate', lambda self, token: calls.append(token) or rotate(self, token))
+        rotation.run(batch_size=2)
+        assert len(calls) == 2 * 3
+        assert db.session.get(KeyRotation, user) is None
+        posts = db.session.scalars(db.select(Post).order_by(Post.id))
+        assert [new_key.decrypt(post.body).decode() for post in posts] == [f'body {i}' for i in range(5)]
@@ -0,0 +1,17 @@
+import os
+
+from accounts.throttle import LoginThrottle
+
+
+def test_state_file_is_written_only_once_there_is_state(app):
+    path = app.config['LOGIN_THROTTLE_STATE']
+    throttle = app.extensions['login_throttle']
+    assert not os.path.exists(path)
+    throttle.persist()
+    assert not os.path.exists(path)
+
+    for _ in range(throttle.limits['email'] + 1):
+        throttle.failure(ip='10.0.0.1', email='user@example.com')
+    throttle.persist()
+    restarted = LoginThrottle(limits=throttle.limits, window=throttle.window, persist_path=path)
+    assert restarted.retry_after(ip='10.0.0.1', email='user@example.com') > 0
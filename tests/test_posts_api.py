@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import BASE_URL
+from config import db, FeedVersion, Post, PostTerm, User
+
+
+def stored(app):
+    """(posts, search index rows, posts feed version) as the database holds them."""
+    with app.app_context():
+        return (db.session.scalar(db.select(db.func.count(Post.id))),
+                db.session.scalar(db.select(db.func.count()).select_from(PostTerm)),
+                FeedVersion.current('posts')[0])
+
+
+def test_batch_is_written_in_order(app, logged_in, user):
+    posts = [{'title': f'Imported {i}', 'body': f'Body {i}'} for i in range(3)]
+    response = logged_in.post(BASE_URL + '/api/posts', json=posts)
+    assert response.status_code == 201, response.json
+    ids = response.json['ids']
+    with app.app_context():
+        author = db.session.get(User, user)
+        assert [author.decrypt(db.session.get(Post, post_id).title) for post_id in ids] == \
+               [post['title'] for post in posts]
+    assert stored(app)[1] > 0
+
+
+def test_invalid_post_rolls_back_the_whole_batch(app, logged_in):
+    before = stored(app)
+    response = logged_in.post(BASE_URL + '/api/posts', json=[{'title': 'Fine', 'body': 'Fine'},
+                                                             {'title': '', 'body': 'No title'}])
+    assert response.status_code == 400
+    assert list(response.json['posts']) == ['1']
+    assert stored(app) == before
+
+
+def test_failure_after_the_inserts_rolls_back_the_whole_batch(app, logged_in, monkeypatch):
+    before = stored(app)
+
+    def fail(connection, feed):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(FeedVersion, 'bump', staticmethod(fail))
+    with pytest.raises(RuntimeError):
+        logged_in.post(BASE_URL + '/api/posts', json=[{'title': f'Post {i}', 'body': 'Body'} for i in range(5)])
+    assert stored(app) == before
+
+
+def test_anonymous_client_gets_json_401(client):
+    response = client.post(BASE_URL + '/api/posts', json=[{'title': 'Title', 'body': 'Body'}])
+    assert response.status_code == 401
+    assert 'error' in response.json
+
+
+def test_user_without_the_end_user_role_gets_json_403(app, logged_in, user):
+    with app.app_context():
+        db.session.get(User, user).role = 'sec_admin'
+        db.session.commit()
+    response = logged_in.post(BASE_URL + '/api/posts', json=[{'title': 'Title', 'body': 'Body'}])
+    assert response.status_code == 403
+    assert 'error' in response.json
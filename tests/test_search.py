@@ -0,0 +1,37 @@
+import re
+
+from conftest import BASE_URL
+from config import db, Post, PostTerm
+
+
+def search(client, query):
+    """Ids of the posts a search lists, read from their update links."""
+    response = client.get(BASE_URL + '/posts', query_string={'q': query})
+    assert response.status_code == 200
+    return [int(post_id) for post_id in re.findall(rb'/(\d+)/update', response.data)]
+
+
+def write(client, path, **kwargs):
+    response = client.open(BASE_URL + path, **kwargs)
+    assert response.status_code == 302, response.status_code
+
+
+def test_search_follows_post_updates_and_deletes(app, logged_in):
+    write(logged_in, '/create', method='POST', data={'title': 'Zebra Café', 'body': 'zebra stripes'})
+    write(logged_in, '/create', method='POST', data={'title': 'Lion', 'body': 'a mane'})
+    with app.app_context():
+        zebra, lion = db.session.scalars(db.select(Post.id).order_by(Post.id)).all()
+
+    assert search(logged_in, 'zebra') == [zebra]
+    assert search(logged_in, 'CAFÉ') == [zebra]
+    assert search(logged_in, 'mane') == [lion]
+
+    write(logged_in, f'/{zebra}/update', method='POST', data={'title': 'Giraffe', 'body': 'tall'})
+    assert search(logged_in, 'zebra') == []
+    assert search(logged_in, 'giraffe tall') == [zebra]
+
+    write(logged_in, f'/{zebra}/delete')
+    assert search(logged_in, 'giraffe') == []
+    assert search(logged_in, 'mane') == [lion]
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).where(PostTerm.post_id == zebra)) == 0
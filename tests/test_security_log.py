@@ -0,0 +1,17 @@
+from conftest import close_app, make_app
+from security.views import log_index
+
+
+def test_each_app_reads_its_own_security_log(app, tmp_path):
+    with app.app_context():
+        first = log_index()
+        assert first.log_path == app.config['SECURITY_LOG_FILE']
+    other = make_app(tmp_path / 'other')
+    try:
+        with other.app_context():
+            assert log_index() is not first
+            assert log_index().log_path == other.config['SECURITY_LOG_FILE']
+        with app.app_context():
+            assert log_index() is first
+    finally:
+        close_app(other)